@@ -19,16 +19,28 @@ depends_on: Union[str, Sequence[str], None] = None
 
 
 def upgrade() -> None:
-    op.add_column('settings', sa.Column('embedding_mode', sa.String(length=20), nullable=True, server_default='local', comment='Embedding模式: local/api'))
-    op.add_column('settings', sa.Column('embedding_provider', sa.String(length=50), nullable=True, server_default='openai', comment='Embedding API提供商'))
-    op.add_column('settings', sa.Column('embedding_model', sa.String(length=200), nullable=True, server_default='sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2', comment='Embedding模型名称'))
-    op.add_column('settings', sa.Column('embedding_api_key', sa.String(length=500), nullable=True, comment='Embedding API密钥'))
-    op.add_column('settings', sa.Column('embedding_api_base_url', sa.String(length=500), nullable=True, comment='Embedding API地址'))
+    # 合并为单条 ALTER TABLE，只获取一次表锁
+    op.execute(
+        "ALTER TABLE settings "
+        "ADD COLUMN embedding_mode VARCHAR(20) DEFAULT 'local', "
+        "ADD COLUMN embedding_provider VARCHAR(50) DEFAULT 'openai', "
+        "ADD COLUMN embedding_model VARCHAR(200) DEFAULT 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2', "
+        "ADD COLUMN embedding_api_key VARCHAR(500), "
+        "ADD COLUMN embedding_api_base_url VARCHAR(500)"
+    )
+    op.execute("COMMENT ON COLUMN settings.embedding_mode IS 'Embedding模式: local/api'")
+    op.execute("COMMENT ON COLUMN settings.embedding_provider IS 'Embedding API提供商'")
+    op.execute("COMMENT ON COLUMN settings.embedding_model IS 'Embedding模型名称'")
+    op.execute("COMMENT ON COLUMN settings.embedding_api_key IS 'Embedding API密钥'")
+    op.execute("COMMENT ON COLUMN settings.embedding_api_base_url IS 'Embedding API地址'")
 
 
 def downgrade() -> None:
-    op.drop_column('settings', 'embedding_api_base_url')
-    op.drop_column('settings', 'embedding_api_key')
-    op.drop_column('settings', 'embedding_model')
-    op.drop_column('settings', 'embedding_provider')
-    op.drop_column('settings', 'embedding_mode')
+    op.execute(
+        "ALTER TABLE settings "
+        "DROP COLUMN embedding_api_base_url, "
+        "DROP COLUMN embedding_api_key, "
+        "DROP COLUMN embedding_model, "
+        "DROP COLUMN embedding_provider, "
+        "DROP COLUMN embedding_mode"
+    )
@@ -0,0 +1,32 @@
+"""添加记忆查询复合索引
+
+Revision ID: 78445173ec67
+Revises: b3c7c65d9f21
+Create Date: 2026-03-01 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '78445173ec67'
+down_revision: Union[str, None] = 'b3c7c65d9f21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 匹配记忆列表查询的过滤条件与排序（importance_score DESC, created_at DESC）
+    op.create_index(
+        'idx_story_memories_project_type_importance',
+        'story_memories',
+        ['project_id', 'memory_type', sa.text('importance_score DESC'), sa.text('created_at DESC')],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_story_memories_project_type_importance', table_name='story_memories')
@@ -0,0 +1,44 @@
+"""settings表embedding字段设为非空
+
+Revision ID: c81d0e5f3a27
+Revises: 78445173ec67
+Create Date: 2026-03-02 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81d0e5f3a27'
+down_revision: Union[str, None] = '78445173ec67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 先回填历史空值为默认值，再以单条 ALTER TABLE 收紧为 NOT NULL（列已带常量默认值）
+    op.execute(
+        "UPDATE settings SET "
+        "embedding_mode = COALESCE(embedding_mode, 'local'), "
+        "embedding_provider = COALESCE(embedding_provider, 'openai'), "
+        "embedding_model = COALESCE(embedding_model, 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2') "
+        "WHERE embedding_mode IS NULL OR embedding_provider IS NULL OR embedding_model IS NULL"
+    )
+    op.execute(
+        "ALTER TABLE settings "
+        "ALTER COLUMN embedding_mode SET NOT NULL, "
+        "ALTER COLUMN embedding_provider SET NOT NULL, "
+        "ALTER COLUMN embedding_model SET NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "ALTER TABLE settings "
+        "ALTER COLUMN embedding_model DROP NOT NULL, "
+        "ALTER COLUMN embedding_provider DROP NOT NULL, "
+        "ALTER COLUMN embedding_mode DROP NOT NULL"
+    )
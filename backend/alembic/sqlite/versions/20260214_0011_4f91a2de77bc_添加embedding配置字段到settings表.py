@@ -19,18 +19,19 @@ depends_on: Union[str, Sequence[str], None] = None
 
 
 def upgrade() -> None:
-    with op.batch_alter_table('settings', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('embedding_mode', sa.String(length=20), nullable=True, server_default='local', comment='Embedding模式: local/api'))
-        batch_op.add_column(sa.Column('embedding_provider', sa.String(length=50), nullable=True, server_default='openai', comment='Embedding API提供商'))
-        batch_op.add_column(sa.Column('embedding_model', sa.String(length=200), nullable=True, server_default='sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2', comment='Embedding模型名称'))
-        batch_op.add_column(sa.Column('embedding_api_key', sa.String(length=500), nullable=True, comment='Embedding API密钥'))
-        batch_op.add_column(sa.Column('embedding_api_base_url', sa.String(length=500), nullable=True, comment='Embedding API地址'))
+    # 新增列均可为空且默认值为常量，SQLite 原生 ADD COLUMN 即可支持，
+    # 不使用 batch_alter_table，避免整表复制重建
+    op.add_column('settings', sa.Column('embedding_mode', sa.String(length=20), nullable=True, server_default='local', comment='Embedding模式: local/api'))
+    op.add_column('settings', sa.Column('embedding_provider', sa.String(length=50), nullable=True, server_default='openai', comment='Embedding API提供商'))
+    op.add_column('settings', sa.Column('embedding_model', sa.String(length=200), nullable=True, server_default='sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2', comment='Embedding模型名称'))
+    op.add_column('settings', sa.Column('embedding_api_key', sa.String(length=500), nullable=True, comment='Embedding API密钥'))
+    op.add_column('settings', sa.Column('embedding_api_base_url', sa.String(length=500), nullable=True, comment='Embedding API地址'))
 
 
 def downgrade() -> None:
-    with op.batch_alter_table('settings', schema=None) as batch_op:
-        batch_op.drop_column('embedding_api_base_url')
-        batch_op.drop_column('embedding_api_key')
-        batch_op.drop_column('embedding_model')
-        batch_op.drop_column('embedding_provider')
-        batch_op.drop_column('embedding_mode')
+    # SQLite 3.35+ 原生支持 DROP COLUMN（无索引/约束的普通列）
+    op.drop_column('settings', 'embedding_api_base_url')
+    op.drop_column('settings', 'embedding_api_key')
+    op.drop_column('settings', 'embedding_model')
+    op.drop_column('settings', 'embedding_provider')
+    op.drop_column('settings', 'embedding_mode')
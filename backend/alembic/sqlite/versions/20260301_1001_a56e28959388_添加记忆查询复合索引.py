@@ -0,0 +1,32 @@
+"""添加记忆查询复合索引
+
+Revision ID: a56e28959388
+Revises: 4f91a2de77bc
+Create Date: 2026-03-01 10:01:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a56e28959388'
+down_revision: Union[str, None] = '4f91a2de77bc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 匹配记忆列表查询的过滤条件与排序（importance_score DESC, created_at DESC），与模型声明一致
+    op.create_index(
+        'idx_story_memories_project_type_importance',
+        'story_memories',
+        ['project_id', 'memory_type', sa.text('importance_score DESC'), sa.text('created_at DESC')],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_story_memories_project_type_importance', table_name='story_memories')
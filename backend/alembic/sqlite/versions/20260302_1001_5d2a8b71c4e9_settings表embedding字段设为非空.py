@@ -0,0 +1,40 @@
+"""settings表embedding字段设为非空
+
+Revision ID: 5d2a8b71c4e9
+Revises: a56e28959388
+Create Date: 2026-03-02 10:01:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8b71c4e9'
+down_revision: Union[str, None] = 'a56e28959388'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 先回填历史空值为默认值；SQLite 不支持 ALTER COLUMN，需 batch 模式重建表
+    op.execute(
+        "UPDATE settings SET "
+        "embedding_mode = COALESCE(embedding_mode, 'local'), "
+        "embedding_provider = COALESCE(embedding_provider, 'openai'), "
+        "embedding_model = COALESCE(embedding_model, 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2') "
+        "WHERE embedding_mode IS NULL OR embedding_provider IS NULL OR embedding_model IS NULL"
+    )
+    with op.batch_alter_table('settings', schema=None) as batch_op:
+        batch_op.alter_column('embedding_mode', existing_type=sa.String(length=20), nullable=False, existing_server_default='local')
+        batch_op.alter_column('embedding_provider', existing_type=sa.String(length=50), nullable=False, existing_server_default='openai')
+        batch_op.alter_column('embedding_model', existing_type=sa.String(length=200), nullable=False, existing_server_default='sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('settings', schema=None) as batch_op:
+        batch_op.alter_column('embedding_model', existing_type=sa.String(length=200), nullable=True, existing_server_default='sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2')
+        batch_op.alter_column('embedding_provider', existing_type=sa.String(length=50), nullable=True, existing_server_default='openai')
+        batch_op.alter_column('embedding_mode', existing_type=sa.String(length=20), nullable=True, existing_server_default='local')
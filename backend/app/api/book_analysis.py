@@ -1,8 +1,11 @@
 """拆书分析 API"""
+import asyncio
+import io
+
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.common import verify_project_access
+from app.api.common import check_project_access
 from app.api.settings import get_user_ai_service
 from app.database import get_db
 from app.logger import get_logger
@@ -15,11 +18,13 @@ from app.schemas.book_analysis import (
 )
 from app.services.ai_service import AIService
 from app.services.book_analysis_service import (
-    split_book_content,
+    split_book_content_cached,
+    build_chapters_from_pre_split,
     select_chapter_range,
     build_analysis_source_text,
     build_book_analysis_prompt,
-    build_embedding_memory_records,
+    build_chapter_embedding_records,
+    build_result_embedding_records,
 )
 from app.services.memory_service import memory_service
 
@@ -40,7 +45,7 @@ def _to_preview(chapter) -> ChapterPreview:
 @router.post("/split", response_model=BookSplitResponse, summary="拆分章节")
 async def split_book(data: BookSplitRequest) -> BookSplitResponse:
     """将原始小说文本拆分为章节并返回预览"""
-    chapters, detected_by_heading = split_book_content(
+    chapters, detected_by_heading = split_book_content_cached(
         content=data.content,
         min_chapter_length=data.min_chapter_length,
         fallback_paragraph_group_size=data.fallback_paragraph_group_size,
@@ -70,15 +75,21 @@ async def analyze_book(
 ) -> BookAnalyzeResponse:
     """
     执行拆书分析：
-    1. 自动识别章节
+    1. 自动识别章节（提供 pre_split_chapters 时直接使用）
     2. 选择章节范围
     3. 生成结构化拆书表格（Markdown）
     """
-    chapters, _ = split_book_content(
-        content=data.content,
-        min_chapter_length=data.min_chapter_length,
-        fallback_paragraph_group_size=data.fallback_paragraph_group_size,
-    )
+    if data.pre_split_chapters:
+        # 客户端已提供拆分结果，跳过章节识别
+        chapters = build_chapters_from_pre_split(
+            [(ch.title, ch.content) for ch in data.pre_split_chapters]
+        )
+    else:
+        chapters, _ = split_book_content_cached(
+            content=data.content,
+            min_chapter_length=data.min_chapter_length,
+            fallback_paragraph_group_size=data.fallback_paragraph_group_size,
+        )
 
     if data.start_chapter and data.end_chapter and data.start_chapter > data.end_chapter:
         raise HTTPException(status_code=400, detail="start_chapter 不能大于 end_chapter")
@@ -115,26 +126,13 @@ async def analyze_book(
         truncated,
     )
 
-    result_chunks: list[str] = []
-    try:
-        async for chunk in ai_service.generate_text_stream(
-            prompt=prompt,
-            temperature=0.3,
-            auto_mcp=False,
-        ):
-            result_chunks.append(chunk)
-    except Exception as exc:
-        logger.error("拆书分析调用AI失败: %s", exc, exc_info=True)
-        raise HTTPException(status_code=500, detail=f"拆书分析失败: {str(exc)}")
-
-    result_markdown = "".join(result_chunks).strip()
-    if not result_markdown:
-        raise HTTPException(status_code=502, detail="AI未返回有效分析结果，请重试")
-
     embedding_enabled = False
     embedding_project_id = None
     embedding_saved_count = 0
     embedding_error = None
+    embedding_config = None
+    chapter_records = []
+    chapter_embedding_task = None
 
     if data.enable_embedding:
         user_id = getattr(request.state, "user_id", None)
@@ -145,33 +143,81 @@ async def analyze_book(
         if not data.project_id:
             raise HTTPException(status_code=400, detail="启用 embedding 时必须提供 project_id")
 
-        await verify_project_access(data.project_id, user_id, db)
+        await check_project_access(data.project_id, user_id, db)
 
         embedding_enabled = True
         embedding_project_id = data.project_id
 
         try:
-            embedding_records = build_embedding_memory_records(
+            # 章节原文片段不依赖分析结果：在AI生成期间并行计算其向量
+            embedding_config = await memory_service.resolve_embedding_config(user_id=user_id, db=db)
+            chapter_records = build_chapter_embedding_records(
                 chapters=selected_chapters,
-                result_markdown=result_markdown,
-                analyzed_range=f"{start}-{end}",
                 chunk_size=data.embedding_chunk_size,
             )
-            embedding_saved_count = await memory_service.batch_add_memories(
-                user_id=user_id,
-                project_id=data.project_id,
-                memories=embedding_records,
-                db=db,
-            )
-            logger.info(
-                "拆书分析向量写入完成: project=%s, saved=%s/%s",
-                data.project_id[:8],
-                embedding_saved_count,
-                len(embedding_records),
+            chapter_embedding_task = asyncio.create_task(
+                memory_service.embed_texts(
+                    [record["content"] for record in chapter_records],
+                    embedding_config,
+                )
             )
         except Exception as exc:
             embedding_error = str(exc)
-            logger.error("拆书分析向量写入失败: %s", exc, exc_info=True)
+            logger.error("拆书分析向量预计算失败: %s", exc, exc_info=True)
+
+    try:
+        result_buffer = io.StringIO()
+        try:
+            async for chunk in ai_service.generate_text_stream(
+                prompt=prompt,
+                temperature=0.3,
+                auto_mcp=False,
+            ):
+                result_buffer.write(chunk)
+        except Exception as exc:
+            logger.error("拆书分析调用AI失败: %s", exc, exc_info=True)
+            raise HTTPException(status_code=500, detail=f"拆书分析失败: {str(exc)}")
+
+        result_markdown = result_buffer.getvalue().strip()
+        if not result_markdown:
+            raise HTTPException(status_code=502, detail="AI未返回有效分析结果，请重试")
+
+        if chapter_embedding_task:
+            try:
+                chapter_embeddings = await chapter_embedding_task
+                result_records = build_result_embedding_records(
+                    result_markdown=result_markdown,
+                    analyzed_range=f"{start}-{end}",
+                    chunk_size=data.embedding_chunk_size,
+                )
+                result_embeddings = await memory_service.embed_texts(
+                    [record["content"] for record in result_records],
+                    embedding_config,
+                )
+                embedding_records = chapter_records + result_records
+                embedding_saved_count = await memory_service.batch_add_memories(
+                    user_id=user_id,
+                    project_id=data.project_id,
+                    memories=embedding_records,
+                    embedding_config=embedding_config,
+                    embeddings=chapter_embeddings + result_embeddings,
+                )
+                logger.info(
+                    "拆书分析向量写入完成: project=%s, saved=%s/%s",
+                    data.project_id[:8],
+                    embedding_saved_count,
+                    len(embedding_records),
+                )
+            except Exception as exc:
+                embedding_error = str(exc)
+                logger.error("拆书分析向量写入失败: %s", exc, exc_info=True)
+    finally:
+        # 任何提前退出（AI失败、空结果、客户端断开导致的取消）都不再需要章节向量
+        if chapter_embedding_task:
+            if not chapter_embedding_task.done():
+                chapter_embedding_task.cancel()
+            elif not chapter_embedding_task.cancelled():
+                chapter_embedding_task.exception()
 
     return BookAnalyzeResponse(
         total_chapters=len(chapters),
@@ -4,7 +4,7 @@
 """
 from fastapi import HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, exists
 from typing import Optional
 
 from app.models.project import Project
@@ -57,6 +57,44 @@ async def verify_project_access(
     return project
 
 
+async def check_project_access(
+    project_id: str,
+    user_id: Optional[str],
+    db: AsyncSession
+) -> None:
+    """
+    仅校验用户是否有权访问指定项目（不加载项目对象）
+    
+    与 verify_project_access 校验规则一致，但使用 EXISTS 查询，
+    适用于调用方不需要 Project 对象的接口。
+    
+    Args:
+        project_id: 项目ID
+        user_id: 用户ID（从 request.state.user_id 获取）
+        db: 数据库会话
+        
+    Raises:
+        HTTPException: 
+            - 401: 用户未登录
+            - 404: 项目不存在或用户无权访问
+    """
+    if not user_id:
+        raise HTTPException(status_code=401, detail="未登录")
+    
+    result = await db.execute(
+        select(
+            exists().where(
+                Project.id == project_id,
+                Project.user_id == user_id
+            )
+        )
+    )
+    
+    if not result.scalar():
+        logger.warning(f"项目访问被拒绝: project_id={project_id}, user_id={user_id}")
+        raise HTTPException(status_code=404, detail="项目不存在或无权访问")
+
+
 def get_user_id(request: Request) -> Optional[str]:
     """
     从请求中获取用户ID
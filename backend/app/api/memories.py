@@ -1,10 +1,13 @@
 """记忆管理API - 提供记忆的查询、分析等接口"""
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, desc, delete
+from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, and_, desc, delete, insert, update, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from typing import List, Optional
+import asyncio
 from math import ceil
-from app.database import get_db
+from app.database import get_db, get_engine
 from app.models.memory import StoryMemory, PlotAnalysis
 from app.models.chapter import Chapter
 from app.models.project import Project
@@ -12,21 +15,62 @@ from app.services.memory_service import memory_service
 from app.services.plot_analyzer import get_plot_analyzer
 from app.services.foreshadow_service import foreshadow_service
 from app.services.ai_service import create_user_ai_service
-from app.models.settings import Settings
+from app.services.settings_cache import settings_cache
 from app.config import settings as app_settings
 from app.logger import get_logger
-from app.api.common import verify_project_access
+from app.api.common import check_project_access
 import uuid
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/api/memories", tags=["memories"])
 
+# 按数据库类型选择支持 ON CONFLICT 的 insert 构造器
+_dialect_insert = sqlite_insert if 'sqlite' in app_settings.database_url.lower() else pg_insert
+
+
+async def _load_planted_foreshadows(user_id: str, project_id: str) -> list:
+    """使用独立数据库会话加载已埋入伏笔（可与请求会话上的查询并发执行）"""
+    engine = await get_engine(user_id)
+    AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    async with AsyncSessionLocal() as db:
+        return await foreshadow_service.get_planted_foreshadows_for_analysis(
+            db=db,
+            project_id=project_id
+        )
+
+
+async def _auto_update_foreshadows_background(
+    user_id: str,
+    project_id: str,
+    chapter_id: str,
+    chapter_number: int,
+    analysis_foreshadows: list
+):
+    """后台根据分析结果自动更新伏笔状态（使用独立数据库会话）"""
+    try:
+        engine = await get_engine(user_id)
+        AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        
+        async with AsyncSessionLocal() as db:
+            foreshadow_stats = await foreshadow_service.auto_update_from_analysis(
+                db=db,
+                project_id=project_id,
+                chapter_id=chapter_id,
+                chapter_number=chapter_number,
+                analysis_foreshadows=analysis_foreshadows
+            )
+        logger.info(f"📊 伏笔自动更新: 埋入{foreshadow_stats['planted_count']}个, 回收{foreshadow_stats['resolved_count']}个")
+    except Exception as fs_error:
+        logger.error(f"⚠️ 伏笔自动更新失败（不影响分析结果）: {str(fs_error)}")
+
 
 @router.post("/projects/{project_id}/analyze-chapter/{chapter_id}")
 async def analyze_chapter(
     project_id: str,
     chapter_id: str,
     request: Request,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -37,54 +81,69 @@ async def analyze_chapter(
     try:
         user_id = getattr(request.state, 'user_id', None)
         
-        # 验证用户权限
-        await verify_project_access(project_id, user_id, db)
+        if not user_id:
+            raise HTTPException(status_code=401, detail="未登录")
         
-        # 获取章节内容
+        # 获取章节内容，同时JOIN项目完成权限校验（单次查询）
         result = await db.execute(
-            select(Chapter).where(
+            select(Chapter, Project.user_id)
+            .join(Project, Project.id == Chapter.project_id)
+            .where(
                 and_(
                     Chapter.id == chapter_id,
                     Chapter.project_id == project_id
                 )
             )
         )
-        chapter = result.scalar_one_or_none()
+        row = result.one_or_none()
         
-        if not chapter:
+        if not row:
             raise HTTPException(status_code=404, detail="章节不存在")
         
+        chapter, owner_id = row
+        if owner_id != user_id:
+            logger.warning(f"项目访问被拒绝: project_id={project_id}, user_id={user_id}")
+            raise HTTPException(status_code=404, detail="项目不存在或无权访问")
+        
         if not chapter.content:
             raise HTTPException(status_code=400, detail="章节内容为空,无法分析")
         
-        # 获取用户AI设置
-        settings_result = await db.execute(
-            select(Settings).where(Settings.user_id == user_id)
-        )
-        settings = settings_result.scalar_one_or_none()
-        
-        if not settings:
-            raise HTTPException(status_code=400, detail="请先配置AI设置")
-        
-        # 创建AI服务
-        ai_service = create_user_ai_service(
-            api_provider=settings.api_provider,
-            api_key=settings.api_key,
-            api_base_url=settings.api_base_url,
-            model_name=settings.llm_model,
-            temperature=settings.temperature,
-            max_tokens=settings.max_tokens
+        # 使用独立会话并行加载已埋入伏笔，与设置读取、AI服务构建重叠
+        foreshadow_task = asyncio.create_task(
+            _load_planted_foreshadows(user_id=user_id, project_id=project_id)
         )
         
-        # 获取已埋入的伏笔列表（用于回收匹配）
-        existing_foreshadows = await foreshadow_service.get_planted_foreshadows_for_analysis(
-            db=db,
-            project_id=project_id
-        )
+        try:
+            # 获取用户AI设置
+            settings = await settings_cache.get_settings(user_id, db)
+            
+            if not settings:
+                raise HTTPException(status_code=400, detail="请先配置AI设置")
+            
+            # 创建AI服务
+            ai_service = create_user_ai_service(
+                api_provider=settings.api_provider,
+                api_key=settings.api_key,
+                api_base_url=settings.api_base_url,
+                model_name=settings.llm_model,
+                temperature=settings.temperature,
+                max_tokens=settings.max_tokens
+            )
+            
+            analyzer = get_plot_analyzer(ai_service)
+            
+            # 获取已埋入的伏笔列表（用于回收匹配）
+            existing_foreshadows = await foreshadow_task
+        finally:
+            # 提前退出（含客户端断开）时取消并行任务，避免其独立会话悬挂
+            if not foreshadow_task.done():
+                foreshadow_task.cancel()
+            elif not foreshadow_task.cancelled():
+                # 标记异常已读取，避免未await时的 "exception was never retrieved" 告警
+                foreshadow_task.exception()
         logger.info(f"📋 已获取{len(existing_foreshadows)}个已埋入伏笔用于分析匹配")
         
         # 执行剧情分析（传入已有伏笔列表）
-        analyzer = get_plot_analyzer(ai_service)
         analysis_result = await analyzer.analyze_chapter(
             chapter_number=chapter.chapter_number,
             title=chapter.title,
@@ -98,49 +157,70 @@ async def analyze_chapter(
         if not analysis_result:
             raise HTTPException(status_code=500, detail="剧情分析失败")
         
-        # 保存分析结果到数据库
-        plot_analysis = PlotAnalysis(
-            id=str(uuid.uuid4()),
-            project_id=project_id,
-            chapter_id=chapter_id,
-            plot_stage=analysis_result.get('plot_stage'),
-            conflict_level=analysis_result.get('conflict', {}).get('level'),
-            conflict_types=analysis_result.get('conflict', {}).get('types'),
-            emotional_tone=analysis_result.get('emotional_arc', {}).get('primary_emotion'),
-            emotional_intensity=analysis_result.get('emotional_arc', {}).get('intensity', 0) / 10,
-            emotional_curve=analysis_result.get('emotional_arc'),
-            hooks=analysis_result.get('hooks'),
-            hooks_count=len(analysis_result.get('hooks', [])),
-            hooks_avg_strength=sum(h.get('strength', 0) for h in analysis_result.get('hooks', [])) / max(len(analysis_result.get('hooks', [])), 1),
-            foreshadows=analysis_result.get('foreshadows'),
-            foreshadows_planted=sum(1 for f in analysis_result.get('foreshadows', []) if f.get('type') == 'planted'),
-            foreshadows_resolved=sum(1 for f in analysis_result.get('foreshadows', []) if f.get('type') == 'resolved'),
-            plot_points=analysis_result.get('plot_points'),
-            plot_points_count=len(analysis_result.get('plot_points', [])),
-            character_states=analysis_result.get('character_states'),
-            scenes=analysis_result.get('scenes'),
-            pacing=analysis_result.get('pacing'),
-            dialogue_ratio=analysis_result.get('dialogue_ratio'),
-            description_ratio=analysis_result.get('description_ratio'),
-            overall_quality_score=analysis_result.get('scores', {}).get('overall'),
-            pacing_score=analysis_result.get('scores', {}).get('pacing'),
-            engagement_score=analysis_result.get('scores', {}).get('engagement'),
-            coherence_score=analysis_result.get('scores', {}).get('coherence'),
-            analysis_report=analyzer.generate_analysis_summary(analysis_result),
-            suggestions=analysis_result.get('suggestions'),
-            word_count=chapter.word_count
+        # 一次遍历预先计算统计值，避免重复遍历钩子/伏笔列表
+        hooks = analysis_result.get('hooks') or []
+        foreshadows = analysis_result.get('foreshadows') or []
+        plot_points = analysis_result.get('plot_points') or []
+        conflict = analysis_result.get('conflict') or {}
+        emotional_arc = analysis_result.get('emotional_arc') or {}
+        scores = analysis_result.get('scores') or {}
+        
+        hooks_count = len(hooks)
+        hooks_strength_sum = sum(h.get('strength', 0) for h in hooks)
+        foreshadows_planted = 0
+        foreshadows_resolved = 0
+        for f in foreshadows:
+            foreshadow_type = f.get('type')
+            if foreshadow_type == 'planted':
+                foreshadows_planted += 1
+            elif foreshadow_type == 'resolved':
+                foreshadows_resolved += 1
+        
+        # 保存分析结果到数据库（按chapter_id唯一约束UPSERT，单次往返）
+        plot_values = {
+            "id": str(uuid.uuid4()),
+            "project_id": project_id,
+            "chapter_id": chapter_id,
+            "plot_stage": analysis_result.get('plot_stage'),
+            "conflict_level": conflict.get('level'),
+            "conflict_types": conflict.get('types'),
+            "emotional_tone": emotional_arc.get('primary_emotion'),
+            "emotional_intensity": emotional_arc.get('intensity', 0) / 10,
+            "emotional_curve": analysis_result.get('emotional_arc'),
+            "hooks": analysis_result.get('hooks'),
+            "hooks_count": hooks_count,
+            "hooks_avg_strength": hooks_strength_sum / max(hooks_count, 1),
+            "foreshadows": analysis_result.get('foreshadows'),
+            "foreshadows_planted": foreshadows_planted,
+            "foreshadows_resolved": foreshadows_resolved,
+            "plot_points": analysis_result.get('plot_points'),
+            "plot_points_count": len(plot_points),
+            "character_states": analysis_result.get('character_states'),
+            "scenes": analysis_result.get('scenes'),
+            "pacing": analysis_result.get('pacing'),
+            "dialogue_ratio": analysis_result.get('dialogue_ratio'),
+            "description_ratio": analysis_result.get('description_ratio'),
+            "overall_quality_score": scores.get('overall'),
+            "pacing_score": scores.get('pacing'),
+            "engagement_score": scores.get('engagement'),
+            "coherence_score": scores.get('coherence'),
+            "analysis_report": analyzer.generate_analysis_summary(analysis_result),
+            "suggestions": analysis_result.get('suggestions'),
+            "word_count": chapter.word_count
+        }
+        upsert_stmt = _dialect_insert(PlotAnalysis).values(**plot_values)
+        upsert_stmt = upsert_stmt.on_conflict_do_update(
+            index_elements=[PlotAnalysis.chapter_id],
+            set_={
+                **{key: upsert_stmt.excluded[key] for key in plot_values if key != "id"},
+                "created_at": func.now(),
+            }
         )
-        
-        # 检查是否已存在分析记录，如有则删除
-        existing_result = await db.execute(
-            select(PlotAnalysis).where(PlotAnalysis.chapter_id == chapter_id)
+        upsert_result = await db.execute(
+            upsert_stmt.returning(PlotAnalysis),
+            execution_options={"populate_existing": True}
         )
-        existing_analysis = existing_result.scalar_one_or_none()
-        if existing_analysis:
-            await db.delete(existing_analysis)
-            await db.flush()
-        
-        db.add(plot_analysis)
+        plot_analysis = upsert_result.scalar_one()
         await db.commit()
         
         # 从分析结果中提取记忆片段
@@ -156,55 +236,67 @@ async def analyze_chapter(
             if settings.embedding_mode == "api" and settings.embedding_model
             else memory_service.local_model_name
         )
-        saved_count = 0
+        memory_rows = []
+        memory_records = []
         for mem_data in memories_data:
             memory_id = str(uuid.uuid4())
+            metadata = mem_data['metadata']
             
-            # 保存到关系数据库
-            memory = StoryMemory(
-                id=memory_id,
-                project_id=project_id,
-                chapter_id=chapter_id,
-                memory_type=mem_data['type'],
-                title=mem_data.get('title', ''),
-                content=mem_data['content'],
-                story_timeline=chapter.chapter_number,
-                vector_id=memory_id,
-                embedding_model=memory_embedding_model,
-                **mem_data['metadata']
-            )
-            db.add(memory)
-            
-            # 保存到向量库
-            await memory_service.add_memory(
-                user_id=user_id,
-                project_id=project_id,
-                memory_id=memory_id,
-                content=mem_data['content'],
-                memory_type=mem_data['type'],
-                metadata=mem_data['metadata'],
-                db=db
-            )
-            saved_count += 1
-        
+            # 关系数据库行（按列显式映射，避免元数据中的非列字段）
+            memory_rows.append({
+                "id": memory_id,
+                "project_id": project_id,
+                "chapter_id": chapter_id,
+                "memory_type": mem_data['type'],
+                "title": mem_data.get('title', ''),
+                "content": mem_data['content'],
+                "related_characters": metadata.get('related_characters', []),
+                "related_locations": metadata.get('related_locations', []),
+                "tags": metadata.get('tags', []),
+                "importance_score": metadata.get('importance_score', 0.5),
+                "story_timeline": chapter.chapter_number,
+                "chapter_position": metadata.get('text_position', 0),
+                "text_length": metadata.get('text_length', 0),
+                "is_foreshadow": metadata.get('is_foreshadow', 0),
+                "vector_id": memory_id,
+                "embedding_model": memory_embedding_model,
+            })
+            memory_records.append({
+                "id": memory_id,
+                "content": mem_data['content'],
+                "type": mem_data['type'],
+                "metadata": metadata
+            })
+        
+        # 单条多行INSERT（executemany），替代逐行ORM写入
+        if memory_rows:
+            await db.execute(insert(StoryMemory), memory_rows)
         await db.commit()
         
-        # 【新增】自动更新伏笔状态
-        foreshadow_stats = {"planted_count": 0, "resolved_count": 0, "created_count": 0}
+        # 批量写入向量库（一次性生成embedding）
+        saved_count = len(memory_rows)
+        added_count = await memory_service.batch_add_memories(
+            user_id=user_id,
+            project_id=project_id,
+            memories=memory_records,
+            db=db
+        )
+        logger.info(f"✅ 添加{added_count}/{saved_count}条记忆到向量库")
+        
+        # 【新增】自动更新伏笔状态（后台执行，不阻塞响应）
+        foreshadow_stats = {"planted_count": 0, "resolved_count": 0, "created_count": 0, "status": "skipped"}
         analysis_foreshadows = analysis_result.get('foreshadows', [])
         
         if analysis_foreshadows:
-            try:
-                foreshadow_stats = await foreshadow_service.auto_update_from_analysis(
-                    db=db,
-                    project_id=project_id,
-                    chapter_id=chapter_id,
-                    chapter_number=chapter.chapter_number,
-                    analysis_foreshadows=analysis_foreshadows
-                )
-                logger.info(f"📊 伏笔自动更新: 埋入{foreshadow_stats['planted_count']}个, 回收{foreshadow_stats['resolved_count']}个")
-            except Exception as fs_error:
-                logger.error(f"⚠️ 伏笔自动更新失败（不影响分析结果）: {str(fs_error)}")
+            background_tasks.add_task(
+                _auto_update_foreshadows_background,
+                user_id=user_id,
+                project_id=project_id,
+                chapter_id=chapter_id,
+                chapter_number=chapter.chapter_number,
+                analysis_foreshadows=analysis_foreshadows
+            )
+            foreshadow_stats["status"] = "pending"
         
         logger.info(f"✅ 章节分析完成: 保存{saved_count}条记忆")
         
@@ -238,7 +330,7 @@ async def get_project_memories(
         user_id = getattr(request.state, 'user_id', None)
         
         # 验证用户权限
-        await verify_project_access(project_id, user_id, db)
+        await check_project_access(project_id, user_id, db)
         
         # 构建查询
         query = select(StoryMemory).where(StoryMemory.project_id == project_id)
@@ -276,7 +368,7 @@ async def get_chapter_analysis(
         user_id = getattr(request.state, 'user_id', None)
         
         # 验证用户权限
-        await verify_project_access(project_id, user_id, db)
+        await check_project_access(project_id, user_id, db)
         
         result = await db.execute(
             select(PlotAnalysis).where(
@@ -318,7 +410,7 @@ async def search_memories(
         user_id = getattr(request.state, 'user_id', None)
         
         # 验证用户权限
-        await verify_project_access(project_id, user_id, db)
+        await check_project_access(project_id, user_id, db)
         
         memories = await memory_service.search_memories(
             user_id=user_id,
@@ -354,7 +446,7 @@ async def get_unresolved_foreshadows(
         user_id = getattr(request.state, 'user_id', None)
         
         # 验证用户权限
-        await verify_project_access(project_id, user_id, db)
+        await check_project_access(project_id, user_id, db)
         
         # 从向量库搜索
         foreshadows = await memory_service.find_unresolved_foreshadows(
@@ -386,7 +478,7 @@ async def get_memory_stats(
         user_id = getattr(request.state, 'user_id', None)
         
         # 验证用户权限
-        await verify_project_access(project_id, user_id, db)
+        await check_project_access(project_id, user_id, db)
         
         stats = await memory_service.get_memory_stats(
             user_id=user_id,
@@ -416,21 +508,18 @@ async def delete_chapter_memories(
         user_id = getattr(request.state, 'user_id', None)
         
         # 验证用户权限
-        await verify_project_access(project_id, user_id, db)
+        await check_project_access(project_id, user_id, db)
         
-        # 从数据库删除
+        # 从数据库删除（单条DELETE）
         result = await db.execute(
-            select(StoryMemory).where(
+            delete(StoryMemory).where(
                 and_(
                     StoryMemory.project_id == project_id,
                     StoryMemory.chapter_id == chapter_id
                 )
-            )
+            ).execution_options(synchronize_session=False)
         )
-        memories = result.scalars().all()
-        
-        for memory in memories:
-            await db.delete(memory)
+        deleted_count = result.rowcount
         
         # 从向量库删除
         await memory_service.delete_chapter_memories(
@@ -443,7 +532,7 @@ async def delete_chapter_memories(
         
         return {
             "success": True,
-            "message": f"已删除{len(memories)}条记忆"
+            "message": f"已删除{deleted_count}条记忆"
         }
         
     except Exception as e:
@@ -457,23 +546,26 @@ async def rebuild_project_embeddings(
     project_id: str,
     request: Request,
     batch_size: int = 100,
+    concurrency: int = 4,
     db: AsyncSession = Depends(get_db)
 ):
     """一键重建项目 Embedding（按当前用户配置）"""
     try:
         user_id = getattr(request.state, 'user_id', None)
-        await verify_project_access(project_id, user_id, db)
+        await check_project_access(project_id, user_id, db)
 
         if batch_size < 10:
             batch_size = 10
         if batch_size > 500:
             batch_size = 500
+        # 并发批次数，按 embedding 服务限流情况调整
+        if concurrency < 1:
+            concurrency = 1
+        if concurrency > 8:
+            concurrency = 8
 
         # 获取用户配置，确定重建后记录的 embedding_model
-        settings_result = await db.execute(
-            select(Settings).where(Settings.user_id == user_id)
-        )
-        user_settings = settings_result.scalar_one_or_none()
+        user_settings = await settings_cache.get_settings(user_id, db)
 
         embedding_mode = (user_settings.embedding_mode if user_settings else None) or app_settings.default_embedding_mode or "local"
         if embedding_mode not in ("local", "api"):
@@ -488,14 +580,11 @@ async def rebuild_project_embeddings(
         else:
             target_embedding_model = memory_service.local_model_name
 
-        # 读取项目所有结构化记忆（关系库）
-        memories_result = await db.execute(
-            select(StoryMemory)
-            .where(StoryMemory.project_id == project_id)
-            .order_by(StoryMemory.created_at.asc())
+        # 统计项目结构化记忆数量（记忆本身在重建时按批流式读取）
+        count_result = await db.execute(
+            select(func.count()).select_from(StoryMemory).where(StoryMemory.project_id == project_id)
         )
-        memories = memories_result.scalars().all()
-        total_memories = len(memories)
+        total_memories = count_result.scalar() or 0
 
         # 先清理该项目所有向量集合（兼容历史单集合和新多集合）
         deleted_ok = await memory_service.delete_project_memories(
@@ -505,9 +594,13 @@ async def rebuild_project_embeddings(
         if not deleted_ok:
             raise HTTPException(status_code=500, detail="清理项目向量集合失败")
 
-        # 同步更新关系库中的 embedding_model 字段
-        for mem in memories:
-            mem.embedding_model = target_embedding_model
+        # 同步更新关系库中的 embedding_model 字段（单条UPDATE）
+        await db.execute(
+            update(StoryMemory)
+            .where(StoryMemory.project_id == project_id)
+            .values(embedding_model=target_embedding_model)
+            .execution_options(synchronize_session=False)
+        )
         await db.commit()
 
         if total_memories == 0:
@@ -522,39 +615,65 @@ async def rebuild_project_embeddings(
                 "batches": 0
             }
 
-        rebuilt_count = 0
         batch_total = ceil(total_memories / batch_size)
 
-        for i in range(0, total_memories, batch_size):
-            chunk = memories[i:i + batch_size]
-            records = []
-            for mem in chunk:
-                records.append({
-                    "id": mem.vector_id or mem.id,
-                    "content": mem.content,
-                    "type": mem.memory_type,
-                    "metadata": {
-                        "chapter_id": mem.chapter_id or "",
-                        "chapter_number": mem.story_timeline or 0,
-                        "importance_score": mem.importance_score or 0.5,
-                        "tags": mem.tags or [],
-                        "title": mem.title or "",
-                        "is_foreshadow": mem.is_foreshadow or 0,
-                        "related_characters": mem.related_characters or [],
-                    }
-                })
+        # 预先解析一次 embedding 配置：并发批次不能共享同一个 AsyncSession
+        embedding_config = await memory_service.resolve_embedding_config(user_id=user_id, db=db)
 
+        async def _run_batch(batch_index: int, records: list) -> int:
             added = await memory_service.batch_add_memories(
                 user_id=user_id,
                 project_id=project_id,
                 memories=records,
-                db=db
+                embedding_config=embedding_config
             )
-            rebuilt_count += added
             logger.info(
-                f"🔄 重建Embedding进度: project={project_id[:8]}, batch={i // batch_size + 1}/{batch_total}, "
-                f"batch_size={len(records)}, added={added}, total_added={rebuilt_count}"
+                f"🔄 重建Embedding进度: project={project_id[:8]}, batch={batch_index}/{batch_total}, "
+                f"batch_size={len(records)}, added={added}"
             )
+            return added
+
+        # 服务端游标按批流式读取，内存占用限制在 concurrency * batch_size 行
+        rebuilt_count = 0
+        batch_index = 0
+        pending = set()
+        memories_stream = await db.stream_scalars(
+            select(StoryMemory)
+            .where(StoryMemory.project_id == project_id)
+            .order_by(StoryMemory.created_at.asc())
+            .execution_options(yield_per=batch_size)
+        )
+        try:
+            async for chunk in memories_stream.partitions(batch_size):
+                batch_index += 1
+                records = []
+                for mem in chunk:
+                    records.append({
+                        "id": mem.vector_id or mem.id,
+                        "content": mem.content,
+                        "type": mem.memory_type,
+                        "metadata": {
+                            "chapter_id": mem.chapter_id or "",
+                            "chapter_number": mem.story_timeline or 0,
+                            "importance_score": mem.importance_score or 0.5,
+                            "tags": mem.tags or [],
+                            "title": mem.title or "",
+                            "is_foreshadow": mem.is_foreshadow or 0,
+                            "related_characters": mem.related_characters or [],
+                        }
+                    })
+
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    rebuilt_count += sum(task.result() for task in done)
+                pending.add(asyncio.create_task(_run_batch(batch_index, records)))
+
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                rebuilt_count += sum(task.result() for task in done)
+        finally:
+            for task in pending:
+                task.cancel()
 
         return {
             "success": True,
@@ -1,23 +1,77 @@
 """AI去味API - 核心特色功能"""
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
 
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import get_db, get_engine
 from app.models.generation_history import GenerationHistory
 from app.schemas.polish import PolishRequest, PolishResponse
 from app.services.ai_service import AIService
 from app.services.prompt_service import prompt_service, PromptService
 from app.logger import get_logger
 from app.api.settings import get_user_ai_service
+from app.utils.sse_response import create_sse_response, WizardProgressTracker
 
 router = APIRouter(prefix="/polish", tags=["AI去味"])
 logger = get_logger(__name__)
 
+# 批量去味时同时进行的AI请求数上限，避免触发上游限流
+POLISH_BATCH_CONCURRENCY = 8
+
+# 去味输出token预算：每字符token数估计（含改写余量）与下限
+CJK_TOKENS_PER_CHAR = 1.5
+LATIN_TOKENS_PER_CHAR = 0.6
+MIN_POLISH_MAX_TOKENS = 256
+
+
+def estimate_tokens(text: str, sample_size: int = 1000) -> int:
+    """
+    估算去味输出所需的token预算
+    
+    按前 sample_size 个字符中的中文占比，在中文/拉丁文每字符token数之间插值，
+    中文文本不再按字符数成倍分配，减少生成预算的浪费。
+    """
+    if not text:
+        return MIN_POLISH_MAX_TOKENS
+    sample = text[:sample_size]
+    cjk_ratio = sum(1 for c in sample if '\u4e00' <= c <= '\u9fff') / len(sample)
+    tokens_per_char = LATIN_TOKENS_PER_CHAR + (CJK_TOKENS_PER_CHAR - LATIN_TOKENS_PER_CHAR) * cjk_ratio
+    return max(MIN_POLISH_MAX_TOKENS, int(len(text) * tokens_per_char))
+
+
+async def _persist_polish_history(
+    user_id: str,
+    project_id: str,
+    prompt: str,
+    generated_content: str,
+    model: str
+):
+    """后台写入去味历史记录（使用独立数据库会话，不阻塞响应）"""
+    try:
+        engine = await get_engine(user_id)
+        AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                insert(GenerationHistory).values(
+                    project_id=project_id,
+                    prompt=prompt,
+                    generated_content=generated_content,
+                    model=model
+                )
+            )
+            await db.commit()
+    except Exception as e:
+        logger.error(f"⚠️ 去味历史记录写入失败（不影响去味结果）: {str(e)}")
+
 
 @router.post("", response_model=PolishResponse, summary="AI去味")
 async def polish_text(
     request: PolishRequest,
     http_request: Request,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     user_ai_service: AIService = Depends(get_user_ai_service)
 ):
@@ -52,7 +106,7 @@ async def polish_text(
             provider=request.provider,
             model=request.model,
             temperature=request.temperature,
-            max_tokens=len(request.original_text) * 2  # 预留足够token
+            max_tokens=request.max_tokens or estimate_tokens(request.original_text)
         )
         
         # 计算字数
@@ -61,18 +115,16 @@ async def polish_text(
         
         logger.info(f"AI去味完成，处理后长度: {word_count_after}")
         
-        # 如果提供了项目ID，记录到历史
-        if request.project_id:
-            history = GenerationHistory(
-                project_id=request.project_id,
-                generation_type="polish",
-                prompt=f"原文: {request.original_text[:100]}...",
-                result=polished_text,
-                provider=request.provider or "default",
-                model=request.model or "default"
+        # 如果提供了项目ID，响应返回后在后台记录到历史
+        if request.project_id and user_id:
+            background_tasks.add_task(
+                _persist_polish_history,
+                user_id,
+                request.project_id,
+                f"原文: {request.original_text[:100]}...",
+                polished_text,
+                request.model or "default"
             )
-            db.add(history)
-            await db.commit()
         
         return PolishResponse(
             original_text=request.original_text,
@@ -86,6 +138,76 @@ async def polish_text(
         raise HTTPException(status_code=500, detail=f"AI去味失败: {str(e)}")
 
 
+@router.post("/stream", summary="AI去味（流式）")
+async def polish_text_stream(
+    request: PolishRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    user_ai_service: AIService = Depends(get_user_ai_service)
+):
+    """
+    AI去味（SSE流式版本）
+    
+    边生成边推送内容块，结束时推送与 /polish 相同结构的结果数据
+    """
+    user_id = getattr(http_request.state, 'user_id', None)
+    
+    # 模板在开始推流前获取，请求会话不跨越流式生成过程
+    template = await PromptService.get_template("AI_DENOISING", user_id, db)
+    prompt = PromptService.format_prompt(
+        template,
+        original_text=request.original_text
+    )
+    
+    async def event_generator():
+        tracker = WizardProgressTracker("AI去味")
+        
+        try:
+            yield await tracker.start()
+            logger.info(f"开始AI去味处理（流式），原文长度: {len(request.original_text)}")
+            
+            chunks = []
+            async for chunk in user_ai_service.generate_text_stream(
+                prompt=prompt,
+                provider=request.provider,
+                model=request.model,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens or estimate_tokens(request.original_text)
+            ):
+                chunks.append(chunk)
+                yield await tracker.generating_chunk(chunk)
+            
+            polished_text = "".join(chunks)
+            logger.info(f"AI去味完成，处理后长度: {len(polished_text)}")
+            
+            # 历史记录在响应发送完毕后写入
+            if request.project_id and user_id:
+                background_tasks.add_task(
+                    _persist_polish_history,
+                    user_id,
+                    request.project_id,
+                    f"原文: {request.original_text[:100]}...",
+                    polished_text,
+                    request.model or "default"
+                )
+            
+            yield await tracker.complete()
+            yield await tracker.result(PolishResponse(
+                original_text=request.original_text,
+                polished_text=polished_text,
+                word_count_before=len(request.original_text),
+                word_count_after=len(polished_text)
+            ).model_dump())
+            yield await tracker.done()
+            
+        except Exception as e:
+            logger.error(f"AI去味失败: {str(e)}")
+            yield await tracker.error(f"AI去味失败: {str(e)}")
+    
+    return create_sse_response(event_generator())
+
+
 @router.post("/batch", summary="批量AI去味")
 async def polish_batch(
     texts: list[str],
@@ -105,29 +227,31 @@ async def polish_batch(
         # 获取用户ID
         user_id = getattr(http_request.state, 'user_id', None) if http_request else None
         
-        results = []
+        # 提示词模板与文本无关，只需查询一次
+        template = await PromptService.get_template("AI_DENOISING", user_id, db)
+        semaphore = asyncio.Semaphore(POLISH_BATCH_CONCURRENCY)
         
-        for idx, text in enumerate(texts):
-            logger.info(f"处理第 {idx+1}/{len(texts)} 个文本")
-            
-            # 获取自定义提示词模板
-            template = await PromptService.get_template("AI_DENOISING", user_id, db)
-            # 格式化提示词
+        async def _polish_one(idx: int, text: str) -> dict:
             prompt = PromptService.format_prompt(template, original_text=text)
-            
-            polished_text = await user_ai_service.generate_text(
-                prompt=prompt,
-                provider=provider,
-                model=model
-            )
-            
-            results.append({
+            async with semaphore:
+                logger.info(f"处理第 {idx+1}/{len(texts)} 个文本")
+                polished_text = await user_ai_service.generate_text(
+                    prompt=prompt,
+                    provider=provider,
+                    model=model
+                )
+            return {
                 "index": idx,
                 "original": text,
                 "polished": polished_text,
                 "word_count_before": len(text),
                 "word_count_after": len(polished_text)
-            })
+            }
+        
+        # 并发处理，结果顺序与输入一致
+        results = await asyncio.gather(
+            *(_polish_one(idx, text) for idx, text in enumerate(texts))
+        )
         
         logger.info(f"批量AI去味完成，共处理 {len(results)} 个文本")
         
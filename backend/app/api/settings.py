@@ -23,6 +23,7 @@ from app.user_manager import User
 from app.logger import get_logger
 from app.config import settings as app_settings, PROJECT_ROOT
 from app.services.ai_service import AIService, create_user_ai_service, create_user_ai_service_with_mcp
+from app.services.settings_cache import settings_cache
 
 logger = get_logger(__name__)
 
@@ -207,6 +208,7 @@ async def save_settings(
         
         await db.commit()
         await db.refresh(settings)
+        settings_cache.invalidate_cache(user.user_id)
         logger.info(f"用户 {user.user_id} 更新设置")
     else:
         # 创建新设置
@@ -217,6 +219,7 @@ async def save_settings(
         db.add(settings)
         await db.commit()
         await db.refresh(settings)
+        settings_cache.invalidate_cache(user.user_id)
         logger.info(f"用户 {user.user_id} 创建设置")
     
     return settings
@@ -247,6 +250,7 @@ async def update_settings(
     
     await db.commit()
     await db.refresh(settings)
+    settings_cache.invalidate_cache(user.user_id)
     logger.info(f"用户 {user.user_id} 更新设置")
     
     return settings
@@ -270,6 +274,7 @@ async def delete_settings(
     
     await db.delete(settings)
     await db.commit()
+    settings_cache.invalidate_cache(user.user_id)
     logger.info(f"用户 {user.user_id} 删除设置")
     
     return {"message": "设置已删除", "user_id": user.user_id}
@@ -1022,6 +1027,7 @@ async def activate_preset(
     settings.preferences = json.dumps(prefs, ensure_ascii=False)
     
     await db.commit()
+    settings_cache.invalidate_cache(user.user_id)
     
     logger.info(f"用户 {user.user_id} 激活预设: {target_preset['name']}")
     return {
@@ -1,5 +1,5 @@
 """长期记忆数据模型 - 支持向量检索和剧情分析"""
-from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, Float, JSON, Boolean
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey, Float, JSON, Boolean, Index
 from sqlalchemy.sql import func
 from app.database import Base
 import uuid
@@ -55,6 +55,10 @@ class StoryMemory(Base):
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
     
+    __table_args__ = (
+        Index('idx_story_memories_project_type_importance', project_id, memory_type, importance_score.desc(), created_at.desc()),
+    )
+    
     def __repr__(self):
         return f"<StoryMemory(id={self.id[:8]}, type={self.memory_type}, title={self.title})>"
     
@@ -15,9 +15,9 @@ class Settings(Base):
     api_key = Column(String(500), comment="API密钥")
     api_base_url = Column(String(500), comment="自定义API地址")
     llm_model = Column(String(100), default="gpt-4", comment="模型名称")
-    embedding_mode = Column(String(20), default="local", comment="Embedding模式: local/api")
-    embedding_provider = Column(String(50), default="openai", comment="Embedding API提供商")
-    embedding_model = Column(String(200), default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", comment="Embedding模型名称")
+    embedding_mode = Column(String(20), nullable=False, default="local", server_default="local", comment="Embedding模式: local/api")
+    embedding_provider = Column(String(50), nullable=False, default="openai", server_default="openai", comment="Embedding API提供商")
+    embedding_model = Column(String(200), nullable=False, default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", server_default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", comment="Embedding模型名称")
     embedding_api_key = Column(String(500), comment="Embedding API密钥")
     embedding_api_base_url = Column(String(500), comment="Embedding API地址")
     temperature = Column(Float, default=0.7, comment="温度参数")
@@ -1,5 +1,8 @@
 """拆书分析相关请求/响应模型"""
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+# 单次请求允许的原文总字符数上限（content 或全部已拆分章节合计）
+MAX_BOOK_CHARS = 2_000_000
 
 
 class ChapterPreview(BaseModel):
@@ -15,7 +18,7 @@ class ChapterPreview(BaseModel):
 class BookSplitRequest(BaseModel):
     """章节拆分请求"""
 
-    content: str = Field(..., min_length=20, max_length=2_000_000, description="原始小说文本")
+    content: str = Field(..., min_length=20, max_length=MAX_BOOK_CHARS, description="原始小说文本")
     min_chapter_length: int = Field(100, ge=20, le=5000, description="最小章节长度")
     fallback_paragraph_group_size: int = Field(50, ge=5, le=200, description="回退分组段落数")
 
@@ -29,10 +32,22 @@ class BookSplitResponse(BaseModel):
     note: str | None = Field(None, description="附加说明")
 
 
+class PreSplitChapter(BaseModel):
+    """客户端已拆分的章节"""
+
+    title: str = Field(..., min_length=1, max_length=200, description="章节标题")
+    content: str = Field(..., min_length=1, max_length=MAX_BOOK_CHARS, description="章节正文")
+
+
 class BookAnalyzeRequest(BaseModel):
-    """拆书分析请求"""
+    """拆书分析请求（content 与 pre_split_chapters 二选一）"""
 
-    content: str = Field(..., min_length=20, max_length=2_000_000, description="原始小说文本")
+    content: str = Field("", max_length=MAX_BOOK_CHARS, description="原始小说文本（提供 pre_split_chapters 时可为空）")
+    pre_split_chapters: list[PreSplitChapter] | None = Field(
+        None,
+        max_length=10000,
+        description="已拆分的章节列表（如 /split 后由客户端回传），提供时跳过服务端章节识别",
+    )
     project_id: str | None = Field(None, description="目标项目ID（用于写入Embedding）")
     enable_embedding: bool = Field(False, description="是否将拆书内容写入向量库")
     embedding_chunk_size: int = Field(1800, ge=300, le=4000, description="向量切片长度")
@@ -42,6 +57,19 @@ class BookAnalyzeRequest(BaseModel):
     fallback_paragraph_group_size: int = Field(50, ge=5, le=200, description="回退分组段落数")
     max_chars: int = Field(160000, ge=5000, le=400000, description="送入模型的最大字符数")
 
+    @model_validator(mode="after")
+    def check_source(self) -> "BookAnalyzeRequest":
+        """content 与 pre_split_chapters 必须且只能提供一个，且总字符数不超过上限"""
+        if self.pre_split_chapters:
+            if self.content:
+                raise ValueError("content 与 pre_split_chapters 只能提供一个")
+            total_chars = sum(len(ch.title) + len(ch.content) for ch in self.pre_split_chapters)
+            if total_chars > MAX_BOOK_CHARS:
+                raise ValueError(f"已拆分章节总字符数不能超过 {MAX_BOOK_CHARS}")
+        elif len(self.content) < 20:
+            raise ValueError("请提供原始小说文本（至少20字）或已拆分的章节列表")
+        return self
+
 class BookAnalyzeResponse(BaseModel):
     """拆书分析响应"""
 
@@ -6,10 +6,11 @@ from typing import Optional
 class PolishRequest(BaseModel):
     """AI去味请求模型"""
     original_text: str = Field(..., description="原始文本（AI生成的文本）")
-    project_id: Optional[int] = Field(None, description="项目ID（可选，用于记录历史）")
+    project_id: Optional[str] = Field(None, description="项目ID（可选，用于记录历史）")
     provider: Optional[str] = Field(None, description="AI提供商")
     model: Optional[str] = Field(None, description="AI模型")
     temperature: Optional[float] = Field(0.8, description="温度参数，建议0.7-0.9")
+    max_tokens: Optional[int] = Field(None, ge=1, description="最大生成token数（可选，默认按原文长度估算）")
 
 
 class PolishResponse(BaseModel):
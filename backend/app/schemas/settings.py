@@ -12,9 +12,9 @@ class SettingsBase(BaseModel):
     api_key: Optional[str] = Field(default=None, description="API密钥")
     api_base_url: Optional[str] = Field(default=None, description="自定义API地址")
     llm_model: Optional[str] = Field(default="gpt-4", description="模型名称")
-    embedding_mode: Optional[str] = Field(default="local", description="Embedding模式: local/api")
-    embedding_provider: Optional[str] = Field(default="openai", description="Embedding API提供商")
-    embedding_model: Optional[str] = Field(default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", description="Embedding模型名称")
+    embedding_mode: str = Field(default="local", description="Embedding模式: local/api")
+    embedding_provider: str = Field(default="openai", description="Embedding API提供商")
+    embedding_model: str = Field(default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2", description="Embedding模型名称")
     embedding_api_key: Optional[str] = Field(default=None, description="Embedding API密钥")
     embedding_api_base_url: Optional[str] = Field(default="https://api.openai.com/v1", description="Embedding API地址")
     temperature: Optional[float] = Field(default=0.7, ge=0.0, le=2.0, description="温度参数")
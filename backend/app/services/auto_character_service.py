@@ -13,6 +13,9 @@ from app.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 角色类型显示名称
+_ROLE_TYPE_MAP = {"protagonist": "主角", "supporting": "配角", "antagonist": "反派"}
+
 
 class AutoCharacterService:
     """自动角色引入服务"""
@@ -29,8 +32,7 @@ class AutoCharacterService:
         for char in characters:
             parts = [f"- {char.name}"]
             if char.role_type:
-                role_map = {"protagonist": "主角", "supporting": "配角", "antagonist": "反派"}
-                parts.append(f"({role_map.get(char.role_type, char.role_type)})")
+                parts.append(f"({_ROLE_TYPE_MAP.get(char.role_type, char.role_type)})")
             if char.personality:
                 parts.append(f"性格: {char.personality[:50]}")
             if char.background:
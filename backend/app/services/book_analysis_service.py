@@ -1,20 +1,30 @@
 """拆书分析服务：章节识别、范围选择与提示词构建"""
 from __future__ import annotations
 
+from collections import OrderedDict
 from dataclasses import dataclass
+import hashlib
+import os
 import re
+import time
 import uuid
 from typing import Any, Dict, List, Tuple
 
 
+# 标题行尾使用占有量词（Python 3.11+），匹配失败时不回溯
 CHAPTER_HEADING_PATTERN = re.compile(
-    r"(^\s*(?:第\s*[0-9一二三四五六七八九十百千万零〇两]+\s*[章回节卷篇]|(?:Chapter|CHAPTER)\s*\d+|序章|楔子|尾声|后记|番外)[^\n]*$)",
+    r"(^\s*(?:第\s*(?P<heading_num>[0-9一二三四五六七八九十百千万零〇两]+)\s*[章回节卷篇]|(?:Chapter|CHAPTER)\s*(?P<chapter_num>\d+)|序章|楔子|尾声|后记|番外)[^\n]*+$)",
     re.MULTILINE,
 )
 
+# 章节标题必含的字面关键词，用于在正则扫描前做快速预筛
+_HEADING_KEYWORDS = ("第", "Chapter", "CHAPTER", "序章", "楔子", "尾声", "后记", "番外")
+
 CN_NUMBER_PATTERN = re.compile(r"[零〇一二三四五六七八九十百千万两]+")
 DIGIT_PATTERN = re.compile(r"\d+")
 
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+
 CN_DIGITS = {
     "零": 0,
     "〇": 0,
@@ -37,8 +47,14 @@ CN_UNITS = {
     "万": 10000,
 }
 
+# 数字与单位合并查表：字符 -> (是否为单位, 数值)，每个字符只查一次
+_CN_ALL = {
+    **{ch: (False, value) for ch, value in CN_DIGITS.items()},
+    **{ch: (True, value) for ch, value in CN_UNITS.items()},
+}
+
 
-@dataclass
+@dataclass(slots=True)
 class SplitChapter:
     """拆分后的章节结构"""
 
@@ -52,7 +68,10 @@ class SplitChapter:
 
 def normalize_text(content: str) -> str:
     """统一换行并清理首尾空白"""
-    return content.replace("\r\n", "\n").replace("\r", "\n").strip()
+    # 绝大多数文本只含 \n：先做一次C级查找，不含 \r 时跳过两次整串替换
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content.strip()
 
 
 def chinese_to_int(text: str) -> int | None:
@@ -69,13 +88,16 @@ def chinese_to_int(text: str) -> int | None:
     number = 0
 
     for ch in raw:
-        if ch in CN_DIGITS:
-            number = CN_DIGITS[ch]
+        entry = _CN_ALL.get(ch)
+        if entry is None:
+            return None
+
+        is_unit, value = entry
+        if not is_unit:
+            number = value
             continue
 
-        unit = CN_UNITS.get(ch)
-        if unit is None:
-            return None
+        unit = value
 
         if unit == 10000:
             section = (section + number) * unit
@@ -108,13 +130,27 @@ def extract_chapter_number(title: str, fallback_index: int) -> int:
     return fallback_index
 
 
+def _collapse_whitespace(text: str) -> str:
+    """将连续空白压缩为单个空格并去除首尾空白"""
+    return " ".join(text.split())
+
+
 def _build_preview(content: str, limit: int = 140) -> str:
-    one_line = " ".join(content.split())
+    # 预览只需开头部分：仅压缩前 limit*8 个字符，空白过多导致不足 limit 时再回退全文
+    head = content[:limit * 8]
+    one_line = _collapse_whitespace(head)
+    if len(one_line) <= limit and len(head) < len(content):
+        one_line = _collapse_whitespace(content)
     if len(one_line) <= limit:
         return one_line
     return f"{one_line[:limit]}..."
 
 
+def _summarize(content: str, limit: int = 140) -> Tuple[int, str]:
+    """一次性计算章节字数与预览，预览只扫描正文开头"""
+    return len(content), _build_preview(content, limit)
+
+
 def split_book_content(
     content: str,
     min_chapter_length: int = 100,
@@ -130,26 +166,39 @@ def split_book_content(
     if not text:
         return [], False
 
-    parts = re.split(CHAPTER_HEADING_PATTERN, text)
+    # 不含任何标题关键词时无需整篇正则扫描，直接走段落分组
+    if any(keyword in text for keyword in _HEADING_KEYWORDS):
+        matches = list(CHAPTER_HEADING_PATTERN.finditer(text))
+    else:
+        matches = []
     chapters: List[SplitChapter] = []
     detected_by_heading = False
 
-    if len(parts) > 1:
-        for i in range(1, len(parts), 2):
-            title = (parts[i] or "").strip()
-            chapter_content = (parts[i + 1] if i + 1 < len(parts) else "").strip()
+    if matches:
+        # 直接按匹配边界切片正文，不生成 re.split 的中间列表
+        for i, match in enumerate(matches):
+            title = match.group(0).strip()
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            chapter_content = text[match.end():end].strip()
             if not title or len(chapter_content) < min_chapter_length:
                 continue
 
             index = len(chapters) + 1
+            # 标题正则已捕获的阿拉伯数字即标题中的首个数字串，无需再次扫描标题
+            number_text = match.group("heading_num") or match.group("chapter_num")
+            if number_text and number_text.isdigit():
+                chapter_number = int(number_text)
+            else:
+                chapter_number = extract_chapter_number(title, index)
+            word_count, preview = _summarize(chapter_content)
             chapters.append(
                 SplitChapter(
                     index=index,
-                    chapter_number=extract_chapter_number(title, index),
+                    chapter_number=chapter_number,
                     title=title,
                     content=chapter_content,
-                    word_count=len(chapter_content),
-                    preview=_build_preview(chapter_content),
+                    word_count=word_count,
+                    preview=preview,
                 )
             )
 
@@ -158,7 +207,7 @@ def split_book_content(
     if chapters:
         return chapters, detected_by_heading
 
-    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    paragraphs = [p.strip() for p in _PARAGRAPH_SPLIT.split(text) if p.strip()]
     if not paragraphs:
         return [], False
 
@@ -171,20 +220,82 @@ def split_book_content(
 
         index = len(fallback_chapters) + 1
         title = f"段落组{index}"
+        word_count, preview = _summarize(grouped_text)
         fallback_chapters.append(
             SplitChapter(
                 index=index,
                 chapter_number=index,
                 title=title,
                 content=grouped_text,
-                word_count=len(grouped_text),
-                preview=_build_preview(grouped_text),
+                word_count=word_count,
+                preview=preview,
             )
         )
 
     return fallback_chapters, False
 
 
+def build_chapters_from_pre_split(items: List[Tuple[str, str]]) -> List[SplitChapter]:
+    """将客户端已拆分的 (标题, 正文) 列表构造为章节结构，跳过全文识别"""
+    chapters: List[SplitChapter] = []
+    for title, content in items:
+        chapter_title = title.strip()
+        chapter_content = normalize_text(content)
+        if not chapter_title or not chapter_content:
+            continue
+
+        index = len(chapters) + 1
+        word_count, preview = _summarize(chapter_content)
+        chapters.append(
+            SplitChapter(
+                index=index,
+                chapter_number=extract_chapter_number(chapter_title, index),
+                title=chapter_title,
+                content=chapter_content,
+                word_count=word_count,
+                preview=preview,
+            )
+        )
+
+    return chapters
+
+
+# 拆分结果缓存：/split 与 /analyze 常以相同文本先后调用，避免重复全文扫描
+SPLIT_CACHE_MAX_ENTRIES = 32
+SPLIT_CACHE_TTL_SECONDS = 600
+_split_cache: "OrderedDict[Tuple[str, int, int], Tuple[float, List[SplitChapter], bool]]" = OrderedDict()
+
+
+def split_book_content_cached(
+    content: str,
+    min_chapter_length: int = 100,
+    fallback_paragraph_group_size: int = 50,
+) -> Tuple[List[SplitChapter], bool]:
+    """带缓存的章节拆分，以内容摘要和拆分参数为键（LRU + TTL）"""
+    digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+    key = (digest, min_chapter_length, fallback_paragraph_group_size)
+    now = time.monotonic()
+
+    cached = _split_cache.get(key)
+    if cached is not None:
+        expire_at, chapters, detected_by_heading = cached
+        if now < expire_at:
+            _split_cache.move_to_end(key)
+            return list(chapters), detected_by_heading
+        del _split_cache[key]
+
+    chapters, detected_by_heading = split_book_content(
+        content=content,
+        min_chapter_length=min_chapter_length,
+        fallback_paragraph_group_size=fallback_paragraph_group_size,
+    )
+    _split_cache[key] = (now + SPLIT_CACHE_TTL_SECONDS, chapters, detected_by_heading)
+    while len(_split_cache) > SPLIT_CACHE_MAX_ENTRIES:
+        _split_cache.popitem(last=False)
+
+    return list(chapters), detected_by_heading
+
+
 def select_chapter_range(
     chapters: List[SplitChapter],
     start_chapter: int | None,
@@ -206,21 +317,17 @@ def select_chapter_range(
     if start > end:
         return [], start, end
 
-    selected = [ch for ch in chapters if start <= ch.index <= end]
-    return selected, start, end
+    # 章节索引从1连续编号，直接按位置切片
+    return chapters[start - 1:end], start, end
 
 
 def build_analysis_source_text(chapters: List[SplitChapter]) -> str:
     """将选中的章节拼接为分析输入文本"""
-    lines: List[str] = []
-    for chapter in chapters:
-        lines.append(f"{chapter.title}\n{chapter.content}")
-    return "\n\n".join(lines).strip()
+    return "\n\n".join(f"{chapter.title}\n{chapter.content}" for chapter in chapters).strip()
 
 
-def build_book_analysis_prompt(content: str) -> str:
-    """构建拆书分析提示词（参考 SmartReads 的输出规范）"""
-    return f"""# 角色
+# 拆书分析提示词固定前缀，正文直接拼接在末尾
+_BOOK_ANALYSIS_PROMPT_PREFIX = """# 角色
 你是一位经验丰富的小说编辑和剧情分析师，擅长拆解章节结构并给出可复用的创作洞察。
 
 # 任务
@@ -247,57 +354,60 @@ def build_book_analysis_prompt(content: str) -> str:
 
 以下是正文：
 
-{content}
 """
 
 
+def build_book_analysis_prompt(content: str) -> str:
+    """构建拆书分析提示词（参考 SmartReads 的输出规范）"""
+    return _BOOK_ANALYSIS_PROMPT_PREFIX + content + "\n"
+
+
 def split_text_for_embedding(
     text: str,
     chunk_size: int = 1800,
     overlap: int = 150,
 ) -> List[str]:
     """将长文本切分为适合 embedding 的小片段"""
-    cleaned = " ".join(text.split())
+    cleaned = _collapse_whitespace(text)
     if not cleaned:
         return []
 
     if len(cleaned) <= chunk_size:
         return [cleaned]
 
-    chunks: List[str] = []
+    # 窗口起点截止到首个覆盖文本末尾的窗口
     step = max(1, chunk_size - overlap)
-    start = 0
+    stop = len(cleaned) - chunk_size + step
+    return [
+        part
+        for start in range(0, stop, step)
+        if (part := cleaned[start:start + chunk_size].strip())
+    ]
 
-    while start < len(cleaned):
-        end = min(len(cleaned), start + chunk_size)
-        part = cleaned[start:end].strip()
-        if part:
-            chunks.append(part)
-        if end >= len(cleaned):
-            break
-        start += step
 
-    return chunks
+def _batch_uuid4(count: int) -> List[str]:
+    """一次读取全部随机字节批量生成 uuid4 字符串，避免逐条调用 uuid.uuid4()"""
+    raw = os.urandom(16 * count)
+    return [str(uuid.UUID(bytes=raw[i:i + 16], version=4)) for i in range(0, 16 * count, 16)]
 
 
-def build_embedding_memory_records(
+def build_chapter_embedding_records(
     chapters: List[SplitChapter],
-    result_markdown: str,
-    analyzed_range: str,
     chunk_size: int = 1800,
 ) -> List[Dict[str, Any]]:
-    """构建用于向量存储的记忆记录"""
+    """构建章节原文片段的向量记忆记录（不依赖分析结果，可提前构建）"""
     records: List[Dict[str, Any]] = []
 
     for chapter in chapters:
         full_text = f"{chapter.title}\n{chapter.content}"
         parts = split_text_for_embedding(full_text, chunk_size=chunk_size)
         total_parts = max(1, len(parts))
+        record_ids = _batch_uuid4(len(parts))
 
         for idx, part in enumerate(parts, start=1):
             records.append(
                 {
-                    "id": str(uuid.uuid4()),
+                    "id": record_ids[idx - 1],
                     "content": part,
                     "type": "book_analysis_chapter",
                     "metadata": {
@@ -315,12 +425,24 @@ def build_embedding_memory_records(
                 }
             )
 
+    return records
+
+
+def build_result_embedding_records(
+    result_markdown: str,
+    analyzed_range: str,
+    chunk_size: int = 1800,
+) -> List[Dict[str, Any]]:
+    """构建拆书分析结果的向量记忆记录"""
+    records: List[Dict[str, Any]] = []
+
     result_parts = split_text_for_embedding(result_markdown, chunk_size=chunk_size)
     total_result_parts = max(1, len(result_parts))
+    record_ids = _batch_uuid4(len(result_parts))
     for idx, part in enumerate(result_parts, start=1):
         records.append(
             {
-                "id": str(uuid.uuid4()),
+                "id": record_ids[idx - 1],
                 "content": part,
                 "type": "book_analysis_result",
                 "metadata": {
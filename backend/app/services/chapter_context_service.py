@@ -1,11 +1,18 @@
 """章节上下文构建服务 - 实现RTCO框架的智能上下文构建"""
 
+import asyncio
+from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import Dict, Any, Optional, List
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Sequence, Callable, Awaitable
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy import select, and_, case, cast, func, literal_column
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import aliased, load_only
 import json
 
+from app.config import settings as app_settings
+from app.database import get_engine
 from app.models.chapter import Chapter
 from app.models.project import Project
 from app.models.outline import Outline
@@ -15,11 +22,352 @@ from app.models.memory import StoryMemory
 from app.models.foreshadow import Foreshadow
 from app.models.relationship import CharacterRelationship, Organization, OrganizationMember
 from app.logger import get_logger
+from app.utils.ttl_cache import TTLCache, MISSING
 
 logger = get_logger(__name__)
 
+# 关系/成员等可能较多的查询按批流式读取的行数
+_STREAM_YIELD_PER = 500
 
-@dataclass
+# 角色类型显示名称
+_ROLE_TYPE_MAP = {
+    'protagonist': '主角',
+    'antagonist': '反派',
+    'supporting': '配角'
+}
+# 按 bool(is_organization) 取实体类型名称
+_ENTITY_TYPES = ('角色', '组织')
+
+# 角色上下文实际用到的列，避免加载traits、organization_members等无关大字段
+# 长文本字段只展示开头部分，直接在SQL中截断（substr按字符计数），不传输整段内容
+_CHARACTER_CONTEXT_COLUMNS = (
+    Character.id, Character.name, Character.role_type, Character.age, Character.gender,
+    func.substr(Character.appearance, 1, 100).label('appearance'),
+    func.substr(Character.personality, 1, 100).label('personality'),
+    func.substr(Character.background, 1, 150).label('background'),
+    Character.is_organization, Character.main_career_id, Character.main_career_stage,
+    Character.organization_type,
+    func.substr(Character.organization_purpose, 1, 100).label('organization_purpose'),
+)
+_CAREER_CONTEXT_COLUMNS = load_only(
+    Career.id, Career.name, Career.type, Career.description, Career.category,
+    Career.stages, Career.max_stage, Career.special_abilities
+)
+_CHARACTER_CAREER_CONTEXT_COLUMNS = load_only(
+    CharacterCareer.id, CharacterCareer.character_id, CharacterCareer.career_id,
+    CharacterCareer.career_type, CharacterCareer.current_stage
+)
+
+# 伏笔提醒文本缓存: (项目ID, 章节号) -> (伏笔版本, 提醒文本)
+# 同一章节重试、重新生成时伏笔版本不变，直接复用上次渲染的提醒
+_FORESHADOW_REMINDER_CACHE = TTLCache(ttl_seconds=300, max_entries=1024)
+
+# outline.structure正常只有几KB，超过该长度视为异常数据，不解析直接回退到大纲内容
+_MAX_OUTLINE_STRUCTURE_LENGTH = 64 * 1024
+
+# 最近章节规划只需要plot_summary和key_events，由数据库直接从expansion_plan中提取
+# 非法JSON不提取（返回NULL），由调用方回退到章节摘要
+if 'sqlite' in app_settings.database_url.lower():
+    _PLAN_IS_OBJECT = case(
+        (func.json_valid(Chapter.expansion_plan) == 1, func.json_type(Chapter.expansion_plan))
+    ) == 'object'
+    _PLAN_PLOT_SUMMARY = func.json_extract(Chapter.expansion_plan, '$.plot_summary')
+    _PLAN_KEY_EVENTS_JSON = func.json_extract(Chapter.expansion_plan, '$.key_events')
+else:
+    _PLAN_IS_OBJECT = Chapter.expansion_plan.op('IS', is_comparison=True)(literal_column('JSON OBJECT'))
+    _PLAN_PLOT_SUMMARY = cast(Chapter.expansion_plan, JSONB)['plot_summary'].astext
+    _PLAN_KEY_EVENTS_JSON = cast(Chapter.expansion_plan, JSONB)['key_events'].astext
+
+
+def _truncate(text: str, limit: int, suffix: str = "...") -> str:
+    """超过limit个字符时截断并追加后缀"""
+    return text if len(text) <= limit else text[:limit] + suffix
+
+
+def _character_detail_lines(c: Any) -> List[str]:
+    """角色详细属性行（年龄、性别、外貌、性格、背景），空字段跳过；c为_CHARACTER_CONTEXT_COLUMNS查询出的行"""
+    fields = (
+        ("年龄", c.age),
+        ("性别", c.gender),
+        ("外貌", c.appearance),
+        ("性格", c.personality),
+        ("背景", c.background),
+    )
+    return [f"  {label}: {value}" for label, value in fields if value]
+
+
+def _validate_career_stages(stages: Any) -> Optional[Sequence[dict]]:
+    """校验阶段数据为字典列表，格式异常时返回None"""
+    if stages and not (isinstance(stages, list) and all(isinstance(stage, dict) for stage in stages)):
+        return None
+    return stages or []
+
+
+@lru_cache(maxsize=512)
+def _decode_career_stages(raw: str) -> Optional[tuple]:
+    """解析职业阶段JSON（按原始字符串缓存，结果只读），格式异常时返回None"""
+    try:
+        stages = _validate_career_stages(json.loads(raw))
+    except json.JSONDecodeError:
+        return None
+    return None if stages is None else tuple(stages)
+
+
+def _load_career_stages(career: Career) -> Optional[Sequence[dict]]:
+    """解析职业阶段JSON，格式异常时返回None"""
+    if isinstance(career.stages, str):
+        return _decode_career_stages(career.stages)
+    return _validate_career_stages(career.stages)
+
+
+@lru_cache(maxsize=512)
+def _format_attribute_bonuses(raw: str) -> Optional[str]:
+    """
+    将职业属性加成JSON渲染为"属性:加成"列表，格式异常或为空时返回None
+    
+    按原始JSON字符串缓存：职业对象每次构建都重新查询，但属性加成很少变化
+    """
+    try:
+        bonuses = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not bonuses or not isinstance(bonuses, dict):
+        return None
+    return ", ".join([f"{k}:{v}" for k, v in bonuses.items()])
+
+
+def _index_career_stages(
+    careers_map: Dict[str, Career]
+) -> tuple[Dict[str, Optional[Sequence[dict]]], Dict[tuple, str]]:
+    """
+    一次性解析所有职业的阶段
+    
+    Returns:
+        tuple: (职业ID -> 阶段列表（格式异常为None）, (职业ID, 等级) -> 阶段名称)
+    """
+    stages_by_career: Dict[str, Optional[Sequence[dict]]] = {}
+    stage_names: Dict[tuple, str] = {}
+    for career_id, career in careers_map.items():
+        stages = _load_career_stages(career)
+        if stages is None:
+            logger.warning(f"解析职业阶段失败: {career.name}")
+        stages_by_career[career_id] = stages
+        for stage in stages or ():
+            # 同一等级出现多次时以第一个为准
+            key = (career_id, stage.get('level'))
+            if key not in stage_names:
+                stage_names[key] = stage.get('name')
+    return stages_by_career, stage_names
+
+
+def _career_stage_name(stage_names: Dict[tuple, str], career_id: str, level: Any) -> str:
+    """查询职业当前阶段名称，未定义时回退为“第N阶”"""
+    return stage_names.get((career_id, level)) or f'第{level}阶'
+
+
+def _career_ref_lines(
+    career_relations: List[CharacterCareer],
+    careers_map: Dict[str, Career],
+    stage_names: Dict[tuple, str],
+    prefix: str
+) -> List[str]:
+    """渲染角色的职业引用行：名称、当前/最高阶段与阶段名称（职业不存在时跳过）"""
+    return [
+        f"{prefix}{career.name} ({cc.current_stage}/{career.max_stage}阶 - "
+        f"{_career_stage_name(stage_names, career.id, cc.current_stage)})"
+        for cc in career_relations
+        if (career := careers_map.get(cc.career_id))
+    ]
+
+
+def _career_stage_lines(stages: Sequence[dict]) -> List[str]:
+    """渲染职业阶段体系的各阶段行"""
+    return [
+        f"    {stage.get('level', '?')}阶-{stage.get('name', '未命名')}: {stage.get('description', '')}"
+        for stage in stages
+    ]
+
+
+def _parse_expansion_plan(chapter: Chapter) -> Optional[dict]:
+    """
+    解析章节的expansion_plan（结果缓存在章节实例上）
+    
+    缓存以原始字符串为键，expansion_plan被修改后会重新解析；JSON异常时返回None
+    """
+    raw = chapter.expansion_plan
+    if not raw:
+        return None
+    cached = getattr(chapter, '_parsed_plan_cache', None)
+    if cached is not None and cached[0] is raw:
+        return cached[1]
+    try:
+        plan = json.loads(raw)
+    except json.JSONDecodeError:
+        plan = None
+    if not isinstance(plan, dict):
+        plan = None
+    chapter._parsed_plan_cache = (raw, plan)
+    return plan
+
+
+def _parse_outline_structure(outline: Optional[Outline]) -> Optional[Dict[str, Any]]:
+    """解析大纲的structure字段，无structure、超长、JSON异常或非对象时返回None"""
+    if not outline or not outline.structure:
+        return None
+    if len(outline.structure) > _MAX_OUTLINE_STRUCTURE_LENGTH:
+        logger.warning(f"  ⚠️ outline.structure过长({len(outline.structure)}字符)，跳过解析，使用大纲内容")
+        return None
+    try:
+        structure = json.loads(outline.structure)
+    except json.JSONDecodeError as e:
+        logger.error(f"  ❌ 解析outline.structure失败: {e}")
+        return None
+    return structure if isinstance(structure, dict) else None
+
+
+async def _gather_context_branches(
+    user_id: str,
+    branches: Dict[str, Callable[[AsyncSession], Awaitable[Any]]],
+    mode_label: str
+) -> Dict[str, Any]:
+    """
+    并发执行互不依赖的上下文构建分支
+    
+    AsyncSession 不能跨任务共享，每个分支使用独立会话；
+    失败的分支记录日志并返回None，不影响其他分支；
+    构建被取消时由TaskGroup统一取消所有分支，不留下孤立的查询任务
+    """
+    engine = await get_engine(user_id)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    async def run_branch(name, build_branch):
+        try:
+            async with session_factory() as session:
+                return await build_branch(session)
+        except Exception as e:
+            logger.error(f"❌ [{mode_label}] 上下文分支 {name} 构建失败: {str(e)}")
+            return None
+    
+    async with asyncio.TaskGroup() as tg:
+        tasks = {
+            name: tg.create_task(run_branch(name, build_branch))
+            for name, build_branch in branches.items()
+        }
+    return {name: task.result() for name, task in tasks.items()}
+
+
+async def _fetch_previous_chapter_with_summary(
+    chapter: Chapter,
+    db: AsyncSession
+) -> tuple[Optional[Chapter], Optional[str]]:
+    """
+    查询上一章及其章节摘要记忆（LEFT JOIN，一次往返）
+    
+    不假设序号连续，取 chapter_number < 当前章 中最大的；没有摘要记忆时摘要为None
+    """
+    result = await db.execute(
+        select(Chapter, StoryMemory.content)
+        .outerjoin(
+            StoryMemory,
+            and_(
+                StoryMemory.chapter_id == Chapter.id,
+                StoryMemory.project_id == Chapter.project_id,
+                StoryMemory.memory_type == 'chapter_summary'
+            )
+        )
+        .where(Chapter.project_id == chapter.project_id)
+        .where(Chapter.chapter_number < chapter.chapter_number)
+        .order_by(Chapter.chapter_number.desc())
+        .limit(1)
+    )
+    row = result.first()
+    if row is None:
+        return None, None
+    return row[0], row[1]
+
+
+async def _build_foreshadow_reminders(
+    foreshadow_service,
+    project_id: str,
+    chapter_number: int,
+    db: AsyncSession
+) -> Optional[str]:
+    """
+    获取伏笔提醒信息（增强版，1-N与1-1模式共用）
+    
+    策略：
+    1. 本章必须回收的伏笔（target_resolve_chapter_number == chapter_number）
+    2. 超期未回收的伏笔（target_resolve_chapter_number < chapter_number）
+    3. 即将到期的伏笔（target_resolve_chapter_number 在未来3章内）
+    """
+    try:
+        # 伏笔版本未变化时复用缓存的提醒文本
+        cache_key = (project_id, chapter_number)
+        version = await foreshadow_service.get_foreshadow_version(db, project_id)
+        if not version[0]:
+            # 项目还没有任何伏笔（新项目的常见情况），无需查询和渲染
+            return None
+        cached = _FORESHADOW_REMINDER_CACHE.get(cache_key)
+        if cached is not MISSING and cached[0] == version:
+            return cached[1]
+        
+        # 三类伏笔一次查询取回，按目标回收章节分组
+        buckets = await foreshadow_service.get_reminder_foreshadows(
+            db=db,
+            project_id=project_id,
+            chapter_number=chapter_number,
+            lookahead=3,
+            limit=3
+        )
+        must_resolve = buckets["must_resolve"]
+        overdue = buckets["overdue"]
+        upcoming = buckets["upcoming"]
+        
+        # 每个伏笔渲染为一个字符串（末尾换行即条目间空行），最后统一join
+        lines = []
+        
+        # 1. 本章必须回收的伏笔
+        if must_resolve:
+            lines.append("【🎯 本章必须回收的伏笔】")
+            lines.extend(
+                f"- {f.title}\n"
+                f"  埋入章节：第{f.plant_chapter_number}章\n"
+                f"  伏笔内容：{_truncate(f.content, 100)}\n"
+                + (f"  回收提示：{f.resolution_notes}\n" if f.resolution_notes else "")
+                for f in must_resolve
+            )
+        
+        # 2. 超期未回收的伏笔（最多3个，已在SQL中截取）
+        if overdue:
+            lines.append("【⚠️ 超期待回收伏笔】")
+            lines.extend(
+                f"- {f.title} [已超期{chapter_number - (f.target_resolve_chapter_number or 0)}章]\n"
+                f"  埋入章节：第{f.plant_chapter_number}章，原计划第{f.target_resolve_chapter_number}章回收\n"
+                f"  伏笔内容：{f.content[:80]}...\n"
+                for f in overdue
+            )
+        
+        # 3. 即将到期的伏笔（未来3章内，已排除本章和超期的，最多3个）
+        if upcoming:
+            lines.append("【📋 即将到期的伏笔（仅供参考）】")
+            lines.extend(
+                f"- {f.title}（计划第{f.target_resolve_chapter_number}章回收，"
+                f"还有{(f.target_resolve_chapter_number or 0) - chapter_number}章）"
+                for f in upcoming
+            )
+            lines.append("")
+        
+        reminders = "\n".join(lines) if lines else None
+        
+        _FORESHADOW_REMINDER_CACHE.set(cache_key, (version, reminders))
+        return reminders
+        
+    except Exception as e:
+        logger.error(f"❌ 获取伏笔提醒失败: {str(e)}")
+        return None
+
+
+@dataclass(slots=True)
 class OneToManyContext:
     """
     1-N模式章节上下文数据结构
@@ -64,18 +412,15 @@ class OneToManyContext:
     
     def get_total_context_length(self) -> int:
         """计算总上下文长度"""
-        total = 0
-        for field_name in ['chapter_outline', 'recent_chapters_context', 'continuation_point',
-                          'chapter_characters', 'chapter_careers',
-                          'relevant_memories', 'foreshadow_reminders',
-                          'previous_chapter_summary']:
-            value = getattr(self, field_name, None)
-            if value:
-                total += len(value)
-        return total
+        return sum(len(value) for value in (
+            self.chapter_outline, self.recent_chapters_context, self.continuation_point,
+            self.chapter_characters, self.chapter_careers,
+            self.relevant_memories, self.foreshadow_reminders,
+            self.previous_chapter_summary
+        ) if value)
 
 
-@dataclass
+@dataclass(slots=True)
 class OneToOneContext:
     """
     1-1模式章节上下文数据结构
@@ -117,14 +462,11 @@ class OneToOneContext:
     
     def get_total_context_length(self) -> int:
         """计算总上下文长度"""
-        total = 0
-        for field_name in ['chapter_outline', 'continuation_point', 'previous_chapter_summary',
-                          'chapter_characters', 'chapter_careers', 'foreshadow_reminders',
-                          'relevant_memories']:
-            value = getattr(self, field_name, None)
-            if value:
-                total += len(value)
-        return total
+        return sum(len(value) for value in (
+            self.chapter_outline, self.continuation_point, self.previous_chapter_summary,
+            self.chapter_characters, self.chapter_careers, self.foreshadow_reminders,
+            self.relevant_memories
+        ) if value)
 
 
 # ==================== 1-N模式上下文构建器 ====================
@@ -145,8 +487,9 @@ class OneToManyContextBuilder:
     # 配置常量
     ENDING_LENGTH = 500          # 统一衔接长度500字
     MEMORY_COUNT = 10            # 记忆条数
-    MEMORY_SIMILARITY_THRESHOLD = 0.6  # 记忆相关度阈值
+    MEMORY_SIMILARITY_THRESHOLD = 0.6  # 记忆相关度基准阈值（检索时自适应调整）
     RECENT_CHAPTERS_COUNT = 10   # 最近章节规划数量
+    SKELETON_SAMPLE_INTERVAL = 5  # 故事骨架采样间隔（每N章取1章）
     
     def __init__(self, memory_service=None, foreshadow_service=None):
         """
@@ -178,7 +521,7 @@ class OneToManyContextBuilder:
             project: 项目对象
             outline: 大纲对象（可选）
             user_id: 用户ID
-            db: 数据库会话
+            db: 数据库会话（各构建分支并发使用独立会话，保留参数兼容性）
             style_content: 写作风格内容（可选，不再使用，保留参数兼容性）
             target_word_count: 目标字数
             temp_narrative_perspective: 临时叙事视角（可选，覆盖项目默认）
@@ -211,71 +554,82 @@ class OneToManyContextBuilder:
         
         # === P0-核心信息（始终构建）===
         context.chapter_outline = self._build_chapter_outline_1n(chapter, outline)
+        context.emotional_tone = self._extract_emotional_tone(chapter, outline)
         
-        # === 最近10章expansion_plan摘要 ===
+        # === 并发构建互不依赖的P0/P1/P2分支 ===
+        branches: Dict[str, Callable[[AsyncSession], Awaitable[Any]]] = {
+            "characters": lambda session: self._build_chapter_characters_1n(
+                chapter, project, outline, db=session
+            )
+        }
         if chapter_number > 1:
-            context.recent_chapters_context = await self._build_recent_chapters_context(
-                chapter, project.id, db
+            branches["recent_chapters"] = lambda session: self._build_recent_chapters_context(
+                chapter, project.id, db=session
+            )
+            branches["ending"] = lambda session: self._get_last_ending_enhanced(
+                chapter, db=session, max_length=self.ENDING_LENGTH
+            )
+        if self.memory_service:
+            branches["memories"] = lambda session: self._get_relevant_memories_enhanced(
+                user_id, project.id, chapter_number, context.chapter_outline, db=session
+            )
+        if self.foreshadow_service:
+            branches["foreshadows"] = lambda session: self._get_foreshadow_reminders(
+                project.id, chapter_number, db=session
             )
-            logger.info(f"  ✅ 最近章节规划: {len(context.recent_chapters_context or '')}字符")
+        results = await _gather_context_branches(user_id, branches, "1-N模式")
+        
+        # === 最近10章expansion_plan摘要 ===
+        if chapter_number > 1:
+            context.recent_chapters_context = results.get("recent_chapters")
         
         # === 衔接锚点（统一500字 + 摘要）===
         if chapter_number == 1:
             context.continuation_point = None
             context.previous_chapter_summary = None
             context.previous_chapter_events = None
-            logger.info("  ✅ 第1章无需衔接锚点")
         else:
-            ending_info = await self._get_last_ending_enhanced(
-                chapter, db, self.ENDING_LENGTH
-            )
+            ending_info = results.get("ending") or {}
             context.continuation_point = ending_info.get('ending_text')
             context.previous_chapter_summary = ending_info.get('summary')
             context.previous_chapter_events = ending_info.get('key_events')
-            logger.info(f"  ✅ 衔接锚点: {len(context.continuation_point or '')}字符")
         
         # === P1-重要信息 ===
         # 角色信息（完整版：含年龄、外貌、背景、关系、组织、职业）+ 独立职业详情
-        characters_info, careers_info = await self._build_chapter_characters_1n(
-            chapter, project, outline, db
-        )
+        characters_info, careers_info = results.get("characters") or ("暂无角色信息", None)
         context.chapter_characters = characters_info
         context.chapter_careers = careers_info
-        context.emotional_tone = self._extract_emotional_tone(chapter, outline)
-        logger.info(f"  ✅ 角色信息: {len(context.chapter_characters)}字符")
-        logger.info(f"  ✅ 职业信息: {len(context.chapter_careers or '')}字符")
         
         # === P2-参考信息（始终启用）===
         if self.memory_service:
-            context.relevant_memories = await self._get_relevant_memories_enhanced(
-                user_id, project.id, chapter_number,
-                context.chapter_outline, db
-            )
-            logger.info(f"  ✅ 相关记忆: {len(context.relevant_memories or '')}字符")
+            context.relevant_memories = results.get("memories")
         
         # === P2-伏笔提醒===
         if self.foreshadow_service:
-            context.foreshadow_reminders = await self._get_foreshadow_reminders(
-                project.id, chapter_number, db
-            )
-            if context.foreshadow_reminders:
-                logger.info(f"  ✅ 伏笔提醒: {len(context.foreshadow_reminders)}字符")
+            context.foreshadow_reminders = results.get("foreshadows")
         
         # === 统计信息 ===
-        context.context_stats = {
-            "mode": "one-to-many",
-            "chapter_number": chapter_number,
-            "has_continuation": context.continuation_point is not None,
+        section_lengths = {
+            "outline_length": len(context.chapter_outline),
             "continuation_length": len(context.continuation_point or ""),
+            "previous_summary_length": len(context.previous_chapter_summary or ""),
             "characters_length": len(context.chapter_characters),
             "careers_length": len(context.chapter_careers or ""),
             "recent_context_length": len(context.recent_chapters_context or ""),
             "memories_length": len(context.relevant_memories or ""),
             "foreshadow_length": len(context.foreshadow_reminders or ""),
-            "total_length": context.get_total_context_length()
+        }
+        context.context_stats = {
+            "mode": "one-to-many",
+            "chapter_number": chapter_number,
+            "has_continuation": context.continuation_point is not None,
+            **section_lengths,
+            # 各分段长度已算出，直接求和，避免再遍历一遍字段
+            "total_length": sum(section_lengths.values())
         }
         
-        logger.info(f"📊 [1-N模式] 上下文构建完成: 总长度 {context.context_stats['total_length']} 字符")
+        # 各分段长度统一记录在一条日志中（惰性格式化）
+        logger.info("📊 [1-N模式] 上下文构建完成: %s", context.context_stats)
         
         return context
     
@@ -286,21 +640,20 @@ class OneToManyContextBuilder:
     ) -> str:
         """构建1-N模式的章节大纲"""
         # 优先使用 expansion_plan 的详细规划
-        if chapter.expansion_plan:
-            try:
-                plan = json.loads(chapter.expansion_plan)
-                outline_content = f"""剧情摘要：{plan.get('plot_summary', '无')}
-
-关键事件：
-{chr(10).join(f'- {event}' for event in plan.get('key_events', []))}
-
-角色焦点：{', '.join(plan.get('character_focus', []))}
-情感基调：{plan.get('emotional_tone', '未设定')}
-叙事目标：{plan.get('narrative_goal', '未设定')}
-冲突类型：{plan.get('conflict_type', '未设定')}"""
-                return outline_content
-            except json.JSONDecodeError:
-                pass
+        plan = _parse_expansion_plan(chapter)
+        if plan is not None:
+            key_event_lines = [f"- {event}" for event in plan.get('key_events', ())]
+            return "\n".join((
+                f"剧情摘要：{plan.get('plot_summary', '无')}",
+                "",
+                "关键事件：",
+                *(key_event_lines or ("",)),
+                "",
+                f"角色焦点：{', '.join(plan.get('character_focus', ()))}",
+                f"情感基调：{plan.get('emotional_tone', '未设定')}",
+                f"叙事目标：{plan.get('narrative_goal', '未设定')}",
+                f"冲突类型：{plan.get('conflict_type', '未设定')}",
+            ))
         
         # 回退到大纲内容
         return outline.content if outline else chapter.summary or '暂无大纲'
@@ -315,193 +668,158 @@ class OneToManyContextBuilder:
         """构建1-N模式的角色信息（完整版：含年龄、外貌、背景、关系、组织、职业）+ 独立职业详情"""
         from sqlalchemy import or_
         
-        # 获取所有角色
-        characters_result = await db.execute(
-            select(Character).where(Character.project_id == project.id)
-        )
-        all_characters = characters_result.scalars().all()
-        
-        if not all_characters:
-            return "暂无角色信息", None
-        
-        # 构建全局角色名称映射（用于关系查询）
-        all_char_map = {c.id: c.name for c in all_characters}
-        
         # 从expansion_plan中提取角色焦点
         filter_character_names = None
-        if chapter.expansion_plan:
-            try:
-                plan = json.loads(chapter.expansion_plan)
-                filter_character_names = plan.get('character_focus', [])
-            except json.JSONDecodeError:
-                pass
-        
-        # 筛选角色
-        characters = all_characters
+        plan = _parse_expansion_plan(chapter)
+        if plan is not None:
+            filter_character_names = plan.get('character_focus', [])
+            # 单个角色可能直接写成字符串，统一为列表，避免按字符逐个匹配
+            if isinstance(filter_character_names, str):
+                filter_character_names = [filter_character_names]
+        
+        # 查询本章角色：有角色焦点时在SQL中按名称筛选，最多10个角色
+        characters_query = (
+            select(*_CHARACTER_CONTEXT_COLUMNS)
+            .where(Character.project_id == project.id)
+        )
         if filter_character_names:
-            characters = [c for c in all_characters if c.name in filter_character_names]
+            # 去重后作为IN参数，角色焦点中重复的名称不会产生重复绑定参数
+            filter_name_set = frozenset(name for name in filter_character_names if isinstance(name, str))
+            characters_query = characters_query.where(Character.name.in_(filter_name_set))
+        characters_result = await db.execute(characters_query.limit(10))
+        characters = characters_result.all()
         
         if not characters:
-            return "暂无相关角色", None
+            if not filter_character_names:
+                return "暂无角色信息", None
+            # 区分项目没有任何角色与角色焦点未匹配
+            has_any_character = await db.scalar(
+                select(Character.id).where(Character.project_id == project.id).limit(1)
+            )
+            return ("暂无相关角色" if has_any_character else "暂无角色信息"), None
         
-        # 限制最多10个角色
-        characters = characters[:10]
         character_ids = [c.id for c in characters]
-        
-        # === 批量查询关系数据 ===
-        rels_result = await db.execute(
-            select(CharacterRelationship).where(
+        char_id_set = set(character_ids)
+        
+        # === 批量查询关系数据（只取分组和展示需要的列，不构造ORM对象）===
+        # 关系两端的角色名称随关系一起查询，无需加载项目全部角色
+        from_character = aliased(Character)
+        to_character = aliased(Character)
+        rels_stream = await db.stream(
+            select(
+                CharacterRelationship.character_from_id,
+                CharacterRelationship.character_to_id,
+                CharacterRelationship.relationship_name,
+                from_character.name.label('from_name'),
+                to_character.name.label('to_name')
+            ).outerjoin(
+                from_character, CharacterRelationship.character_from_id == from_character.id
+            ).outerjoin(
+                to_character, CharacterRelationship.character_to_id == to_character.id
+            ).where(
                 CharacterRelationship.project_id == project.id,
                 or_(
                     CharacterRelationship.character_from_id.in_(character_ids),
                     CharacterRelationship.character_to_id.in_(character_ids)
                 )
-            )
+            ).execution_options(yield_per=_STREAM_YIELD_PER)
         )
-        all_rels = rels_result.scalars().all()
         
-        # 按角色ID分组关系
-        char_rels_map: Dict[str, List] = {cid: [] for cid in character_ids}
-        for r in all_rels:
-            if r.character_from_id in char_rels_map:
+        # 按角色ID分组关系（只为本章角色分组）
+        char_rels_map: Dict[str, List] = defaultdict(list)
+        async for r in rels_stream:
+            if r.character_from_id in char_id_set:
                 char_rels_map[r.character_from_id].append(r)
-            if r.character_to_id in char_rels_map:
+            if r.character_to_id in char_id_set:
                 char_rels_map[r.character_to_id].append(r)
         
         # === 批量查询组织成员数据 ===
         non_org_ids = [c.id for c in characters if not c.is_organization]
-        org_memberships_map: Dict[str, List] = {cid: [] for cid in non_org_ids}
+        org_memberships_map: Dict[str, List] = defaultdict(list)
         
         if non_org_ids:
-            member_result = await db.execute(
+            member_stream = await db.stream(
                 select(OrganizationMember, Character.name).join(
                     Organization, OrganizationMember.organization_id == Organization.id
                 ).join(
                     Character, Organization.character_id == Character.id
-                ).where(OrganizationMember.character_id.in_(non_org_ids))
+                ).where(
+                    OrganizationMember.character_id.in_(non_org_ids)
+                ).execution_options(yield_per=_STREAM_YIELD_PER)
             )
-            for m, org_name in member_result.all():
-                if m.character_id in org_memberships_map:
-                    org_memberships_map[m.character_id].append((m, org_name))
+            async for m, org_name in member_stream:
+                org_memberships_map[m.character_id].append((m, org_name))
         
-        # === 批量查询职业关联数据（CharacterCareer）===
+        # === 批量查询职业关联数据（CharacterCareer JOIN Career，一次往返）===
         char_career_result = await db.execute(
-            select(CharacterCareer).where(CharacterCareer.character_id.in_(character_ids))
+            select(CharacterCareer, Career)
+            .options(_CHARACTER_CAREER_CONTEXT_COLUMNS, _CAREER_CONTEXT_COLUMNS)
+            .join(Career, CharacterCareer.career_id == Career.id)
+            .where(CharacterCareer.character_id.in_(character_ids))
         )
-        all_char_careers = char_career_result.scalars().all()
-        
-        # 收集所有职业ID
-        career_ids = set()
-        for cc in all_char_careers:
-            career_ids.add(cc.career_id)
-        # 也加入 main_career_id
-        for c in characters:
-            if not c.is_organization and c.main_career_id:
-                career_ids.add(c.main_career_id)
-        
+        all_char_careers = []
         careers_map: Dict[str, Career] = {}
-        if career_ids:
+        for cc, career in char_career_result.all():
+            all_char_careers.append(cc)
+            careers_map[career.id] = career
+        
+        # 仅通过 main_career_id 引用、尚未加载的职业再补查一次
+        main_only_ids = {
+            c.main_career_id for c in characters
+            if not c.is_organization and c.main_career_id and c.main_career_id not in careers_map
+        }
+        if main_only_ids:
             careers_result = await db.execute(
-                select(Career).where(Career.id.in_(list(career_ids)))
+                select(Career)
+                .options(_CAREER_CONTEXT_COLUMNS)
+                .where(Career.id.in_(main_only_ids))
             )
-            careers_map = {c.id: c for c in careers_result.scalars().all()}
+            for career in careers_result.scalars().all():
+                careers_map[career.id] = career
+        
+        # 每个职业的阶段只解析一次，并按等级建立索引
+        stages_by_career, stage_names = _index_career_stages(careers_map)
         
         # 构建角色ID到职业关联的映射
-        char_career_relations: Dict[str, Dict[str, List]] = {}
+        char_career_relations: Dict[str, Dict[str, List]] = defaultdict(lambda: {'main': [], 'sub': []})
         for cc in all_char_careers:
-            if cc.character_id not in char_career_relations:
-                char_career_relations[cc.character_id] = {'main': [], 'sub': []}
-            if cc.career_type == 'main':
-                char_career_relations[cc.character_id]['main'].append(cc)
-            else:
-                char_career_relations[cc.character_id]['sub'].append(cc)
+            char_career_relations[cc.character_id]['main' if cc.career_type == 'main' else 'sub'].append(cc)
         
         # === 查询组织角色的成员列表 ===
         org_chars = [c for c in characters if c.is_organization]
-        org_members_map: Dict[str, List] = {}
+        org_members_map: Dict[str, List] = defaultdict(list)
         
         if org_chars:
             org_char_ids = [c.id for c in org_chars]
-            orgs_result = await db.execute(
-                select(Organization).where(Organization.character_id.in_(org_char_ids))
+            # 通过Organization关联直接按组织角色ID查询成员，无需先单独查询组织
+            members_stream = await db.stream(
+                select(OrganizationMember, Organization.character_id, Character.name).join(
+                    Organization, OrganizationMember.organization_id == Organization.id
+                ).join(
+                    Character, OrganizationMember.character_id == Character.id
+                ).where(
+                    Organization.character_id.in_(org_char_ids)
+                ).execution_options(yield_per=_STREAM_YIELD_PER)
             )
-            orgs = orgs_result.scalars().all()
-            
-            if orgs:
-                org_id_to_char_id = {o.id: o.character_id for o in orgs}
-                org_ids = [o.id for o in orgs]
-                
-                members_result = await db.execute(
-                    select(OrganizationMember, Character.name).join(
-                        Character, OrganizationMember.character_id == Character.id
-                    ).where(OrganizationMember.organization_id.in_(org_ids))
-                )
-                for m, member_name in members_result.all():
-                    char_id = org_id_to_char_id.get(m.organization_id)
-                    if char_id:
-                        if char_id not in org_members_map:
-                            org_members_map[char_id] = []
-                        org_members_map[char_id].append((m, member_name))
+            async for m, org_char_id, member_name in members_stream:
+                org_members_map[org_char_id].append((m, member_name))
         
         # === 构建完整版角色信息 ===
         characters_info_parts = []
         for c in characters:
-            entity_type = '组织' if c.is_organization else '角色'
-            role_type_map = {
-                'protagonist': '主角',
-                'antagonist': '反派',
-                'supporting': '配角'
-            }
-            role_type = role_type_map.get(c.role_type, c.role_type or '配角')
+            entity_type = _ENTITY_TYPES[bool(c.is_organization)]
+            role_type = _ROLE_TYPE_MAP.get(c.role_type, c.role_type or '配角')
             
             info_lines = [f"【{c.name}】({entity_type}, {role_type})"]
             
             # 详细属性
-            if c.age:
-                info_lines.append(f"  年龄: {c.age}")
-            if c.gender:
-                info_lines.append(f"  性别: {c.gender}")
-            if c.appearance:
-                appearance_preview = c.appearance[:100] if len(c.appearance) > 100 else c.appearance
-                info_lines.append(f"  外貌: {appearance_preview}")
-            if c.personality:
-                personality_preview = c.personality[:100] if len(c.personality) > 100 else c.personality
-                info_lines.append(f"  性格: {personality_preview}")
-            if c.background:
-                background_preview = c.background[:150] if len(c.background) > 150 else c.background
-                info_lines.append(f"  背景: {background_preview}")
+            info_lines.extend(_character_detail_lines(c))
             
             # 职业信息
             if c.id in char_career_relations:
                 career_rel = char_career_relations[c.id]
-                if career_rel['main']:
-                    for cc in career_rel['main']:
-                        career = careers_map.get(cc.career_id)
-                        if career:
-                            try:
-                                stages = json.loads(career.stages) if isinstance(career.stages, str) else career.stages
-                                stage_name = f'第{cc.current_stage}阶'
-                                for stage in (stages or []):
-                                    if stage.get('level') == cc.current_stage:
-                                        stage_name = stage.get('name', stage_name)
-                                        break
-                            except (json.JSONDecodeError, AttributeError, TypeError):
-                                stage_name = f'第{cc.current_stage}阶'
-                            info_lines.append(f"  主职业: {career.name} ({cc.current_stage}/{career.max_stage}阶 - {stage_name})")
-                if career_rel['sub']:
-                    for cc in career_rel['sub']:
-                        career = careers_map.get(cc.career_id)
-                        if career:
-                            try:
-                                stages = json.loads(career.stages) if isinstance(career.stages, str) else career.stages
-                                stage_name = f'第{cc.current_stage}阶'
-                                for stage in (stages or []):
-                                    if stage.get('level') == cc.current_stage:
-                                        stage_name = stage.get('name', stage_name)
-                                        break
-                            except (json.JSONDecodeError, AttributeError, TypeError):
-                                stage_name = f'第{cc.current_stage}阶'
-                            info_lines.append(f"  副职业: {career.name} ({cc.current_stage}/{career.max_stage}阶 - {stage_name})")
+                info_lines.extend(_career_ref_lines(career_rel['main'], careers_map, stage_names, "  主职业: "))
+                info_lines.extend(_career_ref_lines(career_rel['sub'], careers_map, stage_names, "  副职业: "))
             elif not c.is_organization and c.main_career_id:
                 career = careers_map.get(c.main_career_id)
                 if career:
@@ -509,22 +827,19 @@ class OneToManyContextBuilder:
                     info_lines.append(f"  主职业: {career.name}（第{stage}阶段）")
             
             # 角色关系
-            if not c.is_organization and c.id in char_rels_map:
-                rels = char_rels_map[c.id]
+            if not c.is_organization:
+                rels = char_rels_map.get(c.id)
                 if rels:
-                    rel_parts = []
-                    for r in rels:
-                        if r.character_from_id == c.id:
-                            target_name = all_char_map.get(r.character_to_id, "未知")
-                        else:
-                            target_name = all_char_map.get(r.character_from_id, "未知")
-                        rel_name = r.relationship_name or "相关"
-                        rel_parts.append(f"与{target_name}：{rel_name}")
+                    rel_parts = [
+                        f"与{(r.to_name if r.character_from_id == c.id else r.from_name) or '未知'}"
+                        f"：{r.relationship_name or '相关'}"
+                        for r in rels
+                    ]
                     info_lines.append(f"  关系网络: {'；'.join(rel_parts)}")
             
             # 组织归属
-            if not c.is_organization and c.id in org_memberships_map:
-                memberships = org_memberships_map[c.id]
+            if not c.is_organization:
+                memberships = org_memberships_map.get(c.id)
                 if memberships:
                     org_parts = [f"{org_name}（{m.position}）" for m, org_name in memberships[:2]]
                     info_lines.append(f"  组织归属: {'、'.join(org_parts)}")
@@ -534,17 +849,16 @@ class OneToManyContextBuilder:
                 if c.organization_type:
                     info_lines.append(f"  组织类型: {c.organization_type}")
                 if c.organization_purpose:
-                    info_lines.append(f"  组织目的: {c.organization_purpose[:100]}")
-                if c.id in org_members_map:
-                    members = org_members_map[c.id]
-                    if members:
-                        member_parts = [f"{name}（{m.position}）" for m, name in members[:5]]
-                        info_lines.append(f"  组织成员: {'、'.join(member_parts)}")
+                    info_lines.append(f"  组织目的: {c.organization_purpose}")
+                members = org_members_map.get(c.id)
+                if members:
+                    member_parts = [f"{name}（{m.position}）" for m, name in members[:5]]
+                    info_lines.append(f"  组织成员: {'、'.join(member_parts)}")
             
             characters_info_parts.append("\n".join(info_lines))
         
         characters_result_str = "\n\n".join(characters_info_parts)
-        logger.info(f"  ✅ [1-N完整版] 构建了 {len(characters_info_parts)} 个角色信息，总长度: {len(characters_result_str)} 字符")
+        logger.debug("  ✅ [1-N完整版] 构建了 %d 个角色信息，总长度: %d 字符", len(characters_info_parts), len(characters_result_str))
         
         # === 构建独立职业详情 ===
         careers_info_parts = []
@@ -555,17 +869,12 @@ class OneToManyContextBuilder:
                     career_lines.append(f"  描述: {career.description}")
                 if career.category:
                     career_lines.append(f"  分类: {career.category}")
-                try:
-                    stages = json.loads(career.stages) if isinstance(career.stages, str) else career.stages
-                    if stages:
-                        career_lines.append(f"  阶段体系: (共{career.max_stage}阶)")
-                        for stage in stages:
-                            level = stage.get('level', '?')
-                            name = stage.get('name', '未命名')
-                            desc = stage.get('description', '')
-                            career_lines.append(f"    {level}阶-{name}: {desc}")
-                except (json.JSONDecodeError, AttributeError, TypeError):
+                stages = stages_by_career[career_id]
+                if stages is None:
                     career_lines.append(f"  阶段体系: 共{career.max_stage}阶")
+                elif stages:
+                    career_lines.append(f"  阶段体系: (共{career.max_stage}阶)")
+                    career_lines.extend(_career_stage_lines(stages))
                 if career.special_abilities:
                     career_lines.append(f"  特殊能力: {career.special_abilities}")
                 careers_info_parts.append("\n".join(career_lines))
@@ -573,7 +882,7 @@ class OneToManyContextBuilder:
         careers_result_str = None
         if careers_info_parts:
             careers_result_str = "\n\n".join(careers_info_parts)
-            logger.info(f"  ✅ [1-N完整版] 构建了 {len(careers_map)} 个职业详情，总长度: {len(careers_result_str)} 字符")
+            logger.debug("  ✅ [1-N完整版] 构建了 %d 个职业详情，总长度: %d 字符", len(careers_map), len(careers_result_str))
         
         return characters_result_str, careers_result_str
     
@@ -586,7 +895,14 @@ class OneToManyContextBuilder:
         """构建最近10章的expansion_plan摘要"""
         try:
             result = await db.execute(
-                select(Chapter.chapter_number, Chapter.title, Chapter.expansion_plan, Chapter.summary)
+                select(
+                    Chapter.chapter_number,
+                    Chapter.title,
+                    case((_PLAN_IS_OBJECT, True), else_=False).label('has_plan'),
+                    case((_PLAN_IS_OBJECT, _PLAN_PLOT_SUMMARY)).label('plot_summary'),
+                    case((_PLAN_IS_OBJECT, _PLAN_KEY_EVENTS_JSON)).label('key_events_json'),
+                    Chapter.summary
+                )
                 .where(Chapter.project_id == project_id)
                 .where(Chapter.chapter_number < chapter.chapter_number)
                 .order_by(Chapter.chapter_number.desc())
@@ -601,20 +917,19 @@ class OneToManyContextBuilder:
             recent_chapters = sorted(recent_chapters, key=lambda x: x[0])
             
             lines = ["【最近章节规划】"]
-            for ch_num, ch_title, expansion_plan, summary in recent_chapters:
-                if expansion_plan:
-                    try:
-                        plan = json.loads(expansion_plan)
-                        plot_summary = plan.get('plot_summary', '')
-                        key_events = plan.get('key_events', [])
-                        events_str = '；'.join(key_events[:3]) if key_events else ''
-                        line = f"第{ch_num}章《{ch_title}》：{plot_summary}"
-                        if events_str:
-                            line += f"（关键事件：{events_str}）"
-                        lines.append(line)
-                    except json.JSONDecodeError:
-                        if summary:
-                            lines.append(f"第{ch_num}章《{ch_title}》：{summary[:100]}")
+            for ch_num, ch_title, has_plan, plot_summary, key_events_json, summary in recent_chapters:
+                if has_plan:
+                    key_events = []
+                    if key_events_json:
+                        try:
+                            key_events = json.loads(key_events_json)
+                        except json.JSONDecodeError:
+                            pass
+                    events_str = '；'.join(key_events[:3]) if isinstance(key_events, list) else ''
+                    line = f"第{ch_num}章《{ch_title}》：{plot_summary or ''}"
+                    if events_str:
+                        line += f"（关键事件：{events_str}）"
+                    lines.append(line)
                 elif summary:
                     lines.append(f"第{ch_num}章《{ch_title}》：{summary[:100]}")
             
@@ -647,20 +962,16 @@ class OneToManyContextBuilder:
                 query=query_text,
                 limit=15,
                 min_importance=0.0,
-                db=db
+                db=db,
+                min_similarity=self.MEMORY_SIMILARITY_THRESHOLD,
+                adaptive_similarity=True
             )
             
-            # 过滤相关度>0.6
-            filtered_memories = [
-                mem for mem in relevant_memories
-                if mem.get('similarity', 0) > self.MEMORY_SIMILARITY_THRESHOLD
-            ]
-            
-            if not filtered_memories:
+            if not relevant_memories:
                 return None
             
             memory_lines = ["【相关记忆】"]
-            for mem in filtered_memories[:self.MEMORY_COUNT]:
+            for mem in relevant_memories[:self.MEMORY_COUNT]:
                 similarity = mem.get('similarity', 0)
                 content = mem.get('content', '')[:100]
                 memory_lines.append(f"- (相关度:{similarity:.2f}) {content}")
@@ -687,15 +998,8 @@ class OneToManyContextBuilder:
         if chapter.chapter_number <= 1:
             return result_info
         
-        # 查询上一章：不假设序号连续，取 chapter_number < 当前章 中最大的
-        result = await db.execute(
-            select(Chapter)
-            .where(Chapter.project_id == chapter.project_id)
-            .where(Chapter.chapter_number < chapter.chapter_number)
-            .order_by(Chapter.chapter_number.desc())
-            .limit(1)
-        )
-        prev_chapter = result.scalar_one_or_none()
+        # 查询上一章及其摘要记忆
+        prev_chapter, summary_mem = await _fetch_previous_chapter_with_summary(chapter, db)
         
         if not prev_chapter:
             return result_info
@@ -709,35 +1013,22 @@ class OneToManyContextBuilder:
                 result_info['ending_text'] = content[-max_length:]
         
         # 2. 获取上一章摘要
-        summary_result = await db.execute(
-            select(StoryMemory.content)
-            .where(StoryMemory.project_id == chapter.project_id)
-            .where(StoryMemory.chapter_id == prev_chapter.id)
-            .where(StoryMemory.memory_type == 'chapter_summary')
-            .limit(1)
-        )
-        summary_mem = summary_result.scalar_one_or_none()
         
         if summary_mem:
             result_info['summary'] = summary_mem[:300]
         elif prev_chapter.summary:
             result_info['summary'] = prev_chapter.summary[:300]
-        elif prev_chapter.expansion_plan:
-            try:
-                plan = json.loads(prev_chapter.expansion_plan)
+        else:
+            plan = _parse_expansion_plan(prev_chapter)
+            if plan is not None:
                 result_info['summary'] = plan.get('plot_summary', '')[:300]
-            except json.JSONDecodeError:
-                pass
         
         # 3. 提取上一章关键事件
-        if prev_chapter.expansion_plan:
-            try:
-                plan = json.loads(prev_chapter.expansion_plan)
-                key_events = plan.get('key_events', [])
-                if key_events:
-                    result_info['key_events'] = key_events[:5]
-            except json.JSONDecodeError:
-                pass
+        plan = _parse_expansion_plan(prev_chapter)
+        if plan is not None:
+            key_events = plan.get('key_events', [])
+            if key_events:
+                result_info['key_events'] = key_events[:5]
         
         return result_info
     
@@ -747,23 +1038,17 @@ class OneToManyContextBuilder:
         outline: Optional[Outline]
     ) -> str:
         """提取本章情感基调"""
-        if chapter.expansion_plan:
-            try:
-                plan = json.loads(chapter.expansion_plan)
-                tone = plan.get('emotional_tone')
-                if tone:
-                    return tone
-            except json.JSONDecodeError:
-                pass
-        
-        if outline and outline.structure:
-            try:
-                structure = json.loads(outline.structure)
-                tone = structure.get('emotion') or structure.get('emotional_tone')
-                if tone:
-                    return tone
-            except json.JSONDecodeError:
-                pass
+        plan = _parse_expansion_plan(chapter)
+        if plan is not None:
+            tone = plan.get('emotional_tone')
+            if tone:
+                return tone
+        
+        structure = _parse_outline_structure(outline)
+        if structure is not None:
+            tone = structure.get('emotion') or structure.get('emotional_tone')
+            if tone:
+                return tone
         
         return "未设定"
     
@@ -815,13 +1100,14 @@ class OneToManyContextBuilder:
         max_length: int = 500
     ) -> str:
         """格式化记忆为简洁文本（纯记忆，不含伏笔）"""
-        if not relevant:
+        if not relevant or max_length <= 0:
             return None
         
         lines = ["【相关记忆】"]
         current_length = 0
         
-        for mem in relevant:
+        # 每行至少包含"- "两个字符，超出max_length // 2条的记忆不可能放下
+        for mem in relevant[:max_length // 2]:
             content = mem.get('content', '')[:80]
             text = f"- {content}"
             if current_length + len(text) > max_length:
@@ -837,77 +1123,10 @@ class OneToManyContextBuilder:
         chapter_number: int,
         db: AsyncSession
     ) -> Optional[str]:
-        """
-        获取伏笔提醒信息（增强版）
-        
-        策略：
-        1. 本章必须回收的伏笔（target_resolve_chapter_number == chapter_number）
-        2. 超期未回收的伏笔（target_resolve_chapter_number < chapter_number）
-        3. 即将到期的伏笔（target_resolve_chapter_number 在未来3章内）
-        """
+        """获取伏笔提醒信息（本章必须回收、超期、即将到期）"""
         if not self.foreshadow_service:
             return None
-        
-        try:
-            lines = []
-            
-            # 1. 本章必须回收的伏笔
-            must_resolve = await self.foreshadow_service.get_must_resolve_foreshadows(
-                db=db,
-                project_id=project_id,
-                chapter_number=chapter_number
-            )
-            
-            if must_resolve:
-                lines.append("【🎯 本章必须回收的伏笔】")
-                for f in must_resolve:
-                    lines.append(f"- {f.title}")
-                    lines.append(f"  埋入章节：第{f.plant_chapter_number}章")
-                    lines.append(f"  伏笔内容：{f.content[:100]}{'...' if len(f.content) > 100 else ''}")
-                    if f.resolution_notes:
-                        lines.append(f"  回收提示：{f.resolution_notes}")
-                    lines.append("")
-            
-            # 2. 超期未回收的伏笔
-            overdue = await self.foreshadow_service.get_overdue_foreshadows(
-                db=db,
-                project_id=project_id,
-                current_chapter=chapter_number
-            )
-            
-            if overdue:
-                lines.append("【⚠️ 超期待回收伏笔】")
-                for f in overdue[:3]:  # 最多显示3个
-                    overdue_chapters = chapter_number - (f.target_resolve_chapter_number or 0)
-                    lines.append(f"- {f.title} [已超期{overdue_chapters}章]")
-                    lines.append(f"  埋入章节：第{f.plant_chapter_number}章，原计划第{f.target_resolve_chapter_number}章回收")
-                    lines.append(f"  伏笔内容：{f.content[:80]}...")
-                    lines.append("")
-            
-            # 3. 即将到期的伏笔（未来3章内）
-            upcoming = await self.foreshadow_service.get_pending_resolve_foreshadows(
-                db=db,
-                project_id=project_id,
-                current_chapter=chapter_number,
-                lookahead=3
-            )
-            
-            # 过滤：只保留未来章节的，排除本章和超期的
-            upcoming_filtered = [f for f in upcoming
-                               if (f.target_resolve_chapter_number or 0) > chapter_number]
-            
-            if upcoming_filtered:
-                lines.append("【📋 即将到期的伏笔（仅供参考）】")
-                for f in upcoming_filtered[:3]:  # 最多显示3个
-                    remaining = (f.target_resolve_chapter_number or 0) - chapter_number
-                    lines.append(f"- {f.title}（计划第{f.target_resolve_chapter_number}章回收，还有{remaining}章）")
-                lines.append("")
-            
-            return "\n".join(lines) if lines else None
-            
-        except Exception as e:
-            logger.error(f"❌ 获取伏笔提醒失败: {str(e)}")
-            return None
+        return await _build_foreshadow_reminders(self.foreshadow_service, project_id, chapter_number, db)
     
     async def _build_story_skeleton(
         self,
@@ -917,35 +1136,50 @@ class OneToManyContextBuilder:
     ) -> Optional[str]:
         """构建故事骨架（每N章采样）"""
         try:
-            result = await db.execute(
-                select(Chapter.id, Chapter.chapter_number, Chapter.title)
+            # 在SQL中按行号采样（每N章取1章），只传输采样到的章节
+            numbered = (
+                select(
+                    Chapter.id,
+                    Chapter.chapter_number,
+                    Chapter.title,
+                    func.row_number().over(order_by=(Chapter.chapter_number, Chapter.id)).label('rn')
+                )
                 .where(Chapter.project_id == project_id)
                 .where(Chapter.chapter_number < chapter_number)
                 .where(Chapter.content != None)
                 .where(Chapter.content != "")
-                .order_by(Chapter.chapter_number)
+                .subquery()
+            )
+            # 采样章节与摘要记忆一次JOIN查询
+            result = await db.execute(
+                select(numbered.c.id, numbered.c.chapter_number, numbered.c.title, StoryMemory.content)
+                .outerjoin(
+                    StoryMemory,
+                    and_(
+                        StoryMemory.chapter_id == numbered.c.id,
+                        StoryMemory.project_id == project_id,
+                        StoryMemory.memory_type == 'chapter_summary'
+                    )
+                )
+                .where((numbered.c.rn - 1) % self.SKELETON_SAMPLE_INTERVAL == 0)
+                .order_by(numbered.c.chapter_number, numbered.c.id)
             )
-            chapters = result.all()
+            chapters = []
+            for ch_id, ch_num, ch_title, summary in result.all():
+                # 同一章节有多条摘要记忆时只取第一条
+                if chapters and chapters[-1][0] == ch_id:
+                    continue
+                chapters.append((ch_id, ch_num, ch_title, summary))
             
             if not chapters:
                 return None
             
             skeleton_lines = ["【故事骨架】"]
-            for i, (ch_id, ch_num, ch_title) in enumerate(chapters):
-                if i % self.SKELETON_SAMPLE_INTERVAL == 0:
-                    summary_result = await db.execute(
-                        select(StoryMemory.content)
-                        .where(StoryMemory.project_id == project_id)
-                        .where(StoryMemory.chapter_id == ch_id)
-                        .where(StoryMemory.memory_type == 'chapter_summary')
-                        .limit(1)
-                    )
-                    summary = summary_result.scalar_one_or_none()
-                    
-                    if summary:
-                        skeleton_lines.append(f"第{ch_num}章《{ch_title}》：{summary[:100]}")
-                    else:
-                        skeleton_lines.append(f"第{ch_num}章《{ch_title}》")
+            for ch_id, ch_num, ch_title, summary in chapters:
+                if summary:
+                    skeleton_lines.append(f"第{ch_num}章《{ch_title}》：{summary[:100]}")
+                else:
+                    skeleton_lines.append(f"第{ch_num}章《{ch_title}》")
             
             if len(skeleton_lines) <= 1:
                 return None
@@ -977,6 +1211,10 @@ class OneToOneContextBuilder:
     2. 根据角色名检索相关记忆（相关度>0.6）
     """
     
+    # 配置常量
+    MEMORY_COUNT = 10            # 记忆条数
+    MEMORY_SIMILARITY_THRESHOLD = 0.6  # 记忆相关度基准阈值（检索时自适应调整）
+    
     def __init__(self, memory_service=None, foreshadow_service=None):
         """
         初始化构建器
@@ -1005,7 +1243,7 @@ class OneToOneContextBuilder:
             project: 项目对象
             outline: 大纲对象
             user_id: 用户ID
-            db: 数据库会话
+            db: 数据库会话（各构建分支并发使用独立会话，保留参数兼容性）
             target_word_count: 目标字数
             
         Returns:
@@ -1028,98 +1266,58 @@ class OneToOneContextBuilder:
         )
         
         # === P0-核心信息 ===
-        context.chapter_outline = self._build_outline_from_structure(outline, chapter)
+        # outline.structure只解析一次，大纲与角色名提取共用
+        structure = _parse_outline_structure(outline)
+        context.chapter_outline = self._build_outline_from_structure(outline, structure)
         logger.info(f"  ✅ P0-大纲信息: {len(context.chapter_outline)}字符")
         
+        # 从structure中提取本章角色名（纯CPU，不依赖数据库）
+        character_names = []
+        if structure is not None:
+            raw_characters = structure.get('characters', [])
+            # characters可能是字符串列表或字典列表，统一提取为名称字符串列表
+            character_names = [
+                c['name'] if isinstance(c, dict) else c
+                for c in raw_characters
+            ]
+            logger.info(f"  📋 从structure提取角色: {character_names}")
+        
+        # === 并发构建互不依赖的P1/P2分支 ===
+        branches: Dict[str, Callable[[AsyncSession], Awaitable[Any]]] = {}
+        if chapter_number > 1:
+            branches["previous_chapter"] = lambda session: self._get_previous_chapter_context(
+                chapter, db=session
+            )
+        if character_names:
+            branches["characters"] = lambda session: self._build_chapter_characters(
+                project.id, character_names, db=session
+            )
+        if self.foreshadow_service:
+            branches["foreshadows"] = lambda session: self._get_foreshadow_reminders(
+                project.id, chapter_number, db=session
+            )
+        if self.memory_service and context.chapter_outline:
+            branches["memories"] = lambda session: self._get_relevant_memories(
+                user_id, project.id, context.chapter_outline, db=session
+            )
+        results = await _gather_context_branches(user_id, branches, "1-1模式") if branches else {}
+        
         # === P1-重要信息 ===
-        # 1. 获取上一章内容的最后500字和上一章摘要
+        # 1. 上一章内容的最后500字和上一章摘要
         if chapter_number > 1:
-            # 查找前一章：不假设序号连续，取 chapter_number < 当前章 中最大的
-            prev_chapter_result = await db.execute(
-                select(Chapter)
-                .where(Chapter.project_id == chapter.project_id)
-                .where(Chapter.chapter_number < chapter_number)
-                .order_by(Chapter.chapter_number.desc())
-                .limit(1)
+            context.continuation_point, context.previous_chapter_summary = (
+                results.get("previous_chapter") or (None, None)
             )
-            prev_chapter = prev_chapter_result.scalar_one_or_none()
-            
-            if prev_chapter and prev_chapter.content:
-                content = prev_chapter.content.strip()
-                if len(content) <= 500:
-                    context.continuation_point = content
-                else:
-                    context.continuation_point = content[-500:]
-                logger.info(f"  ✅ P1-上一章内容(最后500字): {len(context.continuation_point)}字符")
-                
-                # 获取上一章摘要（优先从记忆系统获取，其次使用章节摘要）
-                summary_result = await db.execute(
-                    select(StoryMemory.content)
-                    .where(StoryMemory.project_id == chapter.project_id)
-                    .where(StoryMemory.chapter_id == prev_chapter.id)
-                    .where(StoryMemory.memory_type == 'chapter_summary')
-                    .limit(1)
-                )
-                summary_mem = summary_result.scalar_one_or_none()
-                
-                if summary_mem:
-                    context.previous_chapter_summary = summary_mem[:300]
-                    logger.info(f"  ✅ P1-上一章摘要(记忆): {len(context.previous_chapter_summary)}字符")
-                elif prev_chapter.summary:
-                    context.previous_chapter_summary = prev_chapter.summary[:300]
-                    logger.info(f"  ✅ P1-上一章摘要(章节): {len(context.previous_chapter_summary)}字符")
-                else:
-                    context.previous_chapter_summary = None
-                    logger.info(f"  ⚠️ P1-上一章摘要: 无")
-            else:
-                context.continuation_point = None
-                context.previous_chapter_summary = None
-                logger.info(f"  ⚠️ P1-上一章内容: 无")
         else:
             context.continuation_point = None
             context.previous_chapter_summary = None
             logger.info(f"  ✅ P1-第1章无需上一章内容")
         
-        # 2. 根据structure中的characters获取角色信息（含职业）
-        character_names = []
-        if outline and outline.structure:
-            try:
-                structure = json.loads(outline.structure)
-                raw_characters = structure.get('characters', [])
-                # characters可能是字符串列表或字典列表，统一提取为名称字符串列表
-                character_names = [
-                    c['name'] if isinstance(c, dict) else c
-                    for c in raw_characters
-                ]
-                logger.info(f"  📋 从structure提取角色: {character_names}")
-            except json.JSONDecodeError:
-                pass
-        
+        # 2. 根据structure中的characters获取的角色信息（含职业）
         if character_names:
-            # 获取角色基本信息
-            characters_result = await db.execute(
-                select(Character)
-                .where(Character.project_id == project.id)
-                .where(Character.name.in_(character_names))
+            context.chapter_characters, context.chapter_careers = (
+                results.get("characters") or ("暂无角色信息", None)
             )
-            characters = characters_result.scalars().all()
-            
-            if characters:
-                # 构建包含职业信息的角色上下文和职业详情
-                characters_info, careers_info = await self._build_characters_and_careers(
-                    db=db,
-                    project_id=project.id,
-                    characters=characters,
-                    filter_character_names=character_names
-                )
-                context.chapter_characters = characters_info
-                context.chapter_careers = careers_info
-                logger.info(f"  ✅ P1-角色信息: {len(context.chapter_characters)}字符")
-                logger.info(f"  ✅ P1-职业信息: {len(context.chapter_careers or '')}字符")
-            else:
-                context.chapter_characters = "暂无角色信息"
-                context.chapter_careers = None
-                logger.info(f"  ⚠️ P1-角色信息: 筛选后无匹配角色")
         else:
             context.chapter_characters = "暂无角色信息"
             context.chapter_careers = None
@@ -1128,61 +1326,21 @@ class OneToOneContextBuilder:
         # === P2-参考信息 ===
         # 1. 伏笔提醒
         if self.foreshadow_service:
-            context.foreshadow_reminders = await self._get_foreshadow_reminders(
-                project.id, chapter_number, db
-            )
+            context.foreshadow_reminders = results.get("foreshadows")
             if context.foreshadow_reminders:
                 logger.info(f"  ✅ P2-伏笔提醒: {len(context.foreshadow_reminders)}字符")
             else:
                 logger.info(f"  ⚠️ P2-伏笔提醒: 无")
         
-        # 2. 根据大纲内容检索相关记忆（相关度>0.4）
+        # 2. 根据大纲内容检索的相关记忆
         if self.memory_service and context.chapter_outline:
-            try:
-                # 使用大纲内容作为查询（截取前500字符以避免过长）
-                query_text = context.chapter_outline[:500].replace('\n', ' ')
-                logger.info(f"  🔍 记忆查询关键词: {query_text[:100]}...")
-                
-                relevant_memories = await self.memory_service.search_memories(
-                    user_id=user_id,
-                    project_id=project.id,
-                    query=query_text,
-                    limit=15,
-                    min_importance=0.0,
-                    db=db
-                )
-                
-                # 过滤相关度阈值为0.6
-                filtered_memories = [
-                    mem for mem in relevant_memories
-                    if mem.get('similarity', 0) > 0.6
-                ]
-                
-                if filtered_memories:
-                    memory_lines = ["【相关记忆】"]
-                    for mem in filtered_memories[:10]:  # 最多显示10条
-                        similarity = mem.get('similarity', 0)
-                        content = mem.get('content', '')[:100]
-                        memory_lines.append(f"- (相关度:{similarity:.2f}) {content}")
-                    
-                    context.relevant_memories = "\n".join(memory_lines)
-                    logger.info(f"  ✅ P2-相关记忆: {len(filtered_memories)}条 (相关度>0.6, 共搜索{len(relevant_memories)}条)")
-                else:
-                    context.relevant_memories = None
-                    logger.info(f"  ⚠️ P2-相关记忆: 无符合条件的记忆 (共搜索到{len(relevant_memories)}条)")
-                    
-            except Exception as e:
-                logger.error(f"  ❌ 检索相关记忆失败: {str(e)}")
-                context.relevant_memories = None
+            context.relevant_memories = results.get("memories")
         else:
             context.relevant_memories = None
             logger.info(f"  ⚠️ P2-相关记忆: 无大纲内容或记忆服务不可用")
         
         # === 统计信息 ===
-        context.context_stats = {
-            "mode": "one-to-one",
-            "chapter_number": chapter_number,
-            "has_previous_content": context.continuation_point is not None,
+        section_lengths = {
             "previous_content_length": len(context.continuation_point or ""),
             "previous_summary_length": len(context.previous_chapter_summary or ""),
             "outline_length": len(context.chapter_outline),
@@ -1190,56 +1348,155 @@ class OneToOneContextBuilder:
             "careers_length": len(context.chapter_careers or ""),
             "foreshadow_length": len(context.foreshadow_reminders or ""),
             "memories_length": len(context.relevant_memories or ""),
-            "total_length": context.get_total_context_length()
+        }
+        context.context_stats = {
+            "mode": "one-to-one",
+            "chapter_number": chapter_number,
+            "has_previous_content": context.continuation_point is not None,
+            **section_lengths,
+            # 各分段长度已算出，直接求和，避免再遍历一遍字段
+            "total_length": sum(section_lengths.values())
         }
         
         logger.info(f"📊 [1-1模式] 上下文构建完成: 总长度 {context.context_stats['total_length']} 字符")
         
         return context
     
+    async def _get_previous_chapter_context(
+        self,
+        chapter: Chapter,
+        db: AsyncSession
+    ) -> tuple[Optional[str], Optional[str]]:
+        """获取上一章内容的最后500字和上一章摘要"""
+        # 查找前一章及其摘要记忆（一次往返）
+        prev_chapter, summary_mem = await _fetch_previous_chapter_with_summary(chapter, db)
+        
+        if not (prev_chapter and prev_chapter.content):
+            logger.info(f"  ⚠️ P1-上一章内容: 无")
+            return None, None
+        
+        content = prev_chapter.content.strip()
+        continuation_point = content if len(content) <= 500 else content[-500:]
+        logger.info(f"  ✅ P1-上一章内容(最后500字): {len(continuation_point)}字符")
+        
+        # 上一章摘要（优先从记忆系统获取，其次使用章节摘要）
+        if summary_mem:
+            previous_summary = summary_mem[:300]
+            logger.info(f"  ✅ P1-上一章摘要(记忆): {len(previous_summary)}字符")
+        elif prev_chapter.summary:
+            previous_summary = prev_chapter.summary[:300]
+            logger.info(f"  ✅ P1-上一章摘要(章节): {len(previous_summary)}字符")
+        else:
+            previous_summary = None
+            logger.info(f"  ⚠️ P1-上一章摘要: 无")
+        
+        return continuation_point, previous_summary
+    
+    async def _build_chapter_characters(
+        self,
+        project_id: str,
+        character_names: List[str],
+        db: AsyncSession
+    ) -> tuple[str, Optional[str]]:
+        """按structure中的角色名查询角色（最多10个），构建角色信息和职业信息"""
+        characters_result = await db.execute(
+            select(*_CHARACTER_CONTEXT_COLUMNS)
+            .where(Character.project_id == project_id)
+            .where(Character.name.in_(character_names))
+            .limit(10)
+        )
+        characters = characters_result.all()
+        
+        if not characters:
+            logger.info(f"  ⚠️ P1-角色信息: 筛选后无匹配角色")
+            return "暂无角色信息", None
+        
+        # 构建包含职业信息的角色上下文和职业详情
+        characters_info, careers_info = await self._build_characters_and_careers(
+            db=db,
+            project_id=project_id,
+            characters=characters
+        )
+        logger.info(f"  ✅ P1-角色信息: {len(characters_info)}字符")
+        logger.info(f"  ✅ P1-职业信息: {len(careers_info or '')}字符")
+        return characters_info, careers_info
+    
+    async def _get_relevant_memories(
+        self,
+        user_id: str,
+        project_id: str,
+        chapter_outline: str,
+        db: AsyncSession
+    ) -> Optional[str]:
+        """根据大纲内容检索相关记忆（相关度>0.6）"""
+        try:
+            # 使用大纲内容作为查询（截取前500字符以避免过长）
+            query_text = chapter_outline[:500].replace('\n', ' ')
+            logger.info(f"  🔍 记忆查询关键词: {query_text[:100]}...")
+            
+            relevant_memories = await self.memory_service.search_memories(
+                user_id=user_id,
+                project_id=project_id,
+                query=query_text,
+                limit=15,
+                min_importance=0.0,
+                db=db,
+                min_similarity=self.MEMORY_SIMILARITY_THRESHOLD,
+                adaptive_similarity=True
+            )
+            
+            if not relevant_memories:
+                logger.info(f"  ⚠️ P2-相关记忆: 无符合条件的记忆 (基准相关度>{self.MEMORY_SIMILARITY_THRESHOLD})")
+                return None
+            
+            memory_lines = ["【相关记忆】"]
+            for mem in relevant_memories[:self.MEMORY_COUNT]:  # 最多显示10条
+                similarity = mem.get('similarity', 0)
+                content = mem.get('content', '')[:100]
+                memory_lines.append(f"- (相关度:{similarity:.2f}) {content}")
+            
+            logger.info(f"  ✅ P2-相关记忆: {len(relevant_memories)}条 (基准相关度>{self.MEMORY_SIMILARITY_THRESHOLD})")
+            return "\n".join(memory_lines)
+            
+        except Exception as e:
+            logger.error(f"  ❌ 检索相关记忆失败: {str(e)}")
+            return None
+    
     def _build_outline_from_structure(
         self,
         outline: Optional[Outline],
-        chapter: Chapter
+        structure: Optional[Dict[str, Any]]
     ) -> str:
-        """从outline.structure提取大纲信息（1-1模式专用）"""
-        if outline and outline.structure:
-            try:
-                structure = json.loads(outline.structure)
-                
-                outline_parts = []
-                
-                if structure.get('summary'):
-                    outline_parts.append(f"【章节概要】\n{structure['summary']}")
-                
-                if structure.get('scenes'):
-                    scenes_text = "\n".join([f"- {scene}" for scene in structure['scenes']])
-                    outline_parts.append(f"【场景设定】\n{scenes_text}")
-                
-                if structure.get('key_points'):
-                    points_text = "\n".join([f"- {point}" for point in structure['key_points']])
-                    outline_parts.append(f"【情节要点】\n{points_text}")
-                
-                if structure.get('emotion'):
-                    outline_parts.append(f"【情感基调】\n{structure['emotion']}")
-                
-                if structure.get('goal'):
-                    outline_parts.append(f"【叙事目标】\n{structure['goal']}")
-                
-                return "\n\n".join(outline_parts)
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"  ❌ 解析outline.structure失败: {e}")
-                return outline.content if outline else "暂无大纲"
-        else:
+        """从已解析的outline.structure提取大纲信息（1-1模式专用），解析失败时回退到outline.content"""
+        if structure is None:
             return outline.content if outline else "暂无大纲"
+        
+        outline_parts = []
+        
+        if structure.get('summary'):
+            outline_parts.append(f"【章节概要】\n{structure['summary']}")
+        
+        if structure.get('scenes'):
+            scenes_text = "\n".join([f"- {scene}" for scene in structure['scenes']])
+            outline_parts.append(f"【场景设定】\n{scenes_text}")
+        
+        if structure.get('key_points'):
+            points_text = "\n".join([f"- {point}" for point in structure['key_points']])
+            outline_parts.append(f"【情节要点】\n{points_text}")
+        
+        if structure.get('emotion'):
+            outline_parts.append(f"【情感基调】\n{structure['emotion']}")
+        
+        if structure.get('goal'):
+            outline_parts.append(f"【叙事目标】\n{structure['goal']}")
+        
+        return "\n\n".join(outline_parts)
     
     async def _build_characters_and_careers(
         self,
         db: AsyncSession,
         project_id: str,
-        characters: list,
-        filter_character_names: Optional[list] = None
+        characters: list
     ) -> tuple[str, Optional[str]]:
         """
         构建角色信息和职业信息（1-1模式专用）
@@ -1249,8 +1506,7 @@ class OneToOneContextBuilder:
         Args:
             db: 数据库会话
             project_id: 项目ID
-            characters: 角色列表
-            filter_character_names: 筛选的角色名称列表
+            characters: 角色行列表（_CHARACTER_CONTEXT_COLUMNS查询结果，已由调用方在SQL中按角色名筛选并限制最多10个）
             
         Returns:
             tuple: (角色信息字符串, 职业信息字符串)
@@ -1258,196 +1514,137 @@ class OneToOneContextBuilder:
         if not characters:
             return '暂无角色信息', None
         
-        # 如果提供了筛选名单，只保留匹配的角色
-        if filter_character_names:
-            filtered_characters = [c for c in characters if c.name in filter_character_names]
-            if not filtered_characters:
-                logger.warning(f"筛选后无匹配角色，使用全部角色。筛选名单: {filter_character_names}")
-                filtered_characters = characters
-            else:
-                logger.info(f"根据筛选名单保留 {len(filtered_characters)}/{len(characters)} 个角色: {[c.name for c in filtered_characters]}")
-            characters = filtered_characters
-        
         # 获取角色ID列表
         character_ids = [c.id for c in characters]
-        if not character_ids:
-            return '暂无角色信息', None
         
-        # 重新查询角色的完整数据（确保获取所有字段）
-        full_characters_result = await db.execute(
-            select(Character).where(Character.id.in_(character_ids))
-        )
-        full_characters = {c.id: c for c in full_characters_result.scalars().all()}
+        # 调用方传入的角色行已包含所需字段，直接建立索引，无需重新查询
+        full_characters = {c.id: c for c in characters}
         
-        # 获取所有角色的职业关联数据
+        # 职业关联与职业完整数据一次JOIN查询
         character_careers_result = await db.execute(
-            select(CharacterCareer).where(CharacterCareer.character_id.in_(character_ids))
+            select(CharacterCareer, Career)
+            .join(Career, CharacterCareer.career_id == Career.id)
+            .where(CharacterCareer.character_id.in_(character_ids))
         )
-        character_careers = character_careers_result.scalars().all()
-        
-        # 收集所有需要查询的职业ID
-        career_ids = set()
-        for cc in character_careers:
-            career_ids.add(cc.career_id)
-        
-        # 查询所有相关职业的完整数据
-        careers_map = {}
-        if career_ids:
-            careers_result = await db.execute(
-                select(Career).where(Career.id.in_(list(career_ids)))
-            )
-            careers_map = {c.id: c for c in careers_result.scalars().all()}
+        character_careers = []
+        careers_map: Dict[str, Career] = {}
+        for cc, career in character_careers_result.all():
+            character_careers.append(cc)
+            careers_map[career.id] = career
+        if careers_map:
             logger.info(f"  📋 查询到 {len(careers_map)} 个职业的完整数据")
         
+        # 每个职业的阶段只解析一次，并按等级建立索引
+        stages_by_career, stage_names = _index_career_stages(careers_map)
+        
         # 构建角色ID到职业关联数据的映射
-        char_career_relations = {}
+        char_career_relations: Dict[str, Dict[str, List]] = defaultdict(lambda: {'main': [], 'sub': []})
         for cc in character_careers:
-            if cc.character_id not in char_career_relations:
-                char_career_relations[cc.character_id] = {'main': [], 'sub': []}
-            
             # 保存完整的CharacterCareer对象
-            if cc.career_type == 'main':
-                char_career_relations[cc.character_id]['main'].append(cc)
-            else:
-                char_career_relations[cc.character_id]['sub'].append(cc)
+            char_career_relations[cc.character_id]['main' if cc.career_type == 'main' else 'sub'].append(cc)
+        
+        # === 批量查询角色关系（含两端角色名称），一次往返 ===
+        non_org_id_set = {
+            cid for cid in character_ids
+            if cid in full_characters and not full_characters[cid].is_organization
+        }
+        rels_by_char: Dict[str, List] = defaultdict(list)
+        if non_org_id_set:
+            from sqlalchemy import or_
+            from_character = aliased(Character)
+            to_character = aliased(Character)
+            rels_result = await db.execute(
+                select(
+                    CharacterRelationship.character_from_id,
+                    CharacterRelationship.character_to_id,
+                    CharacterRelationship.relationship_name,
+                    from_character.name.label('from_name'),
+                    to_character.name.label('to_name')
+                ).outerjoin(
+                    from_character, CharacterRelationship.character_from_id == from_character.id
+                ).outerjoin(
+                    to_character, CharacterRelationship.character_to_id == to_character.id
+                ).where(
+                    CharacterRelationship.project_id == project_id,
+                    or_(
+                        CharacterRelationship.character_from_id.in_(non_org_id_set),
+                        CharacterRelationship.character_to_id.in_(non_org_id_set)
+                    )
+                )
+            )
+            for r in rels_result.all():
+                if r.character_from_id in non_org_id_set:
+                    rels_by_char[r.character_from_id].append(r)
+                if r.character_to_id in non_org_id_set:
+                    rels_by_char[r.character_to_id].append(r)
+        
+        # === 批量查询组织成员（按组织角色ID关联Organization），一次往返 ===
+        org_char_ids = [
+            cid for cid in character_ids
+            if cid in full_characters and full_characters[cid].is_organization
+        ]
+        members_by_org_char: Dict[str, List] = defaultdict(list)
+        if org_char_ids:
+            members_result = await db.execute(
+                select(OrganizationMember, Organization.character_id, Character.name).join(
+                    Organization, OrganizationMember.organization_id == Organization.id
+                ).join(
+                    Character, OrganizationMember.character_id == Character.id
+                ).where(Organization.character_id.in_(org_char_ids))
+            )
+            for m, org_char_id, member_name in members_result.all():
+                members_by_org_char[org_char_id].append((m, member_name))
         
         # 构建角色信息字符串
         characters_info_parts = []
-        for char_id in character_ids[:10]:  # 限制最多10个角色
+        for char_id in character_ids:
             c = full_characters.get(char_id)
             if not c:
                 continue
             
             # === 角色基本信息 ===
-            entity_type = '组织' if c.is_organization else '角色'
-            role_type_map = {
-                'protagonist': '主角',
-                'antagonist': '反派',
-                'supporting': '配角'
-            }
-            role_type = role_type_map.get(c.role_type, c.role_type or '配角')
+            entity_type = _ENTITY_TYPES[bool(c.is_organization)]
+            role_type = _ROLE_TYPE_MAP.get(c.role_type, c.role_type or '配角')
             
             # 构建基本信息行
             info_lines = [f"【{c.name}】({entity_type}, {role_type})"]
             
             # === 角色详细属性 ===
-            if c.age:
-                info_lines.append(f"  年龄: {c.age}")
-            if c.gender:
-                info_lines.append(f"  性别: {c.gender}")
-            if c.appearance:
-                appearance_preview = c.appearance[:100] if len(c.appearance) > 100 else c.appearance
-                info_lines.append(f"  外貌: {appearance_preview}")
-            if c.personality:
-                personality_preview = c.personality[:100] if len(c.personality) > 100 else c.personality
-                info_lines.append(f"  性格: {personality_preview}")
-            if c.background:
-                background_preview = c.background[:150] if len(c.background) > 150 else c.background
-                info_lines.append(f"  背景: {background_preview}")
+            info_lines.extend(_character_detail_lines(c))
             
             # === 职业信息（完整数据）===
             if char_id in char_career_relations:
                 career_relations = char_career_relations[char_id]
                 
-                # 主职业
-                if career_relations['main']:
-                    for cc in career_relations['main']:
-                        career = careers_map.get(cc.career_id)
-                        if career:
-                            # 解析职业的完整阶段信息
-                            try:
-                                stages = json.loads(career.stages) if isinstance(career.stages, str) else career.stages
-                                current_stage_info = None
-                                for stage in stages:
-                                    if stage.get('level') == cc.current_stage:
-                                        current_stage_info = stage
-                                        break
-                                
-                                stage_name = current_stage_info.get('name', f'第{cc.current_stage}阶') if current_stage_info else f'第{cc.current_stage}阶'
-                            except (json.JSONDecodeError, AttributeError, TypeError) as e:
-                                logger.warning(f"解析职业阶段信息失败: {e}")
-                                stage_name = f'第{cc.current_stage}阶'
-                                stage_desc = ''
-                            
-                            # 构建主职业信息（只显示引用，详细信息在下面的"本章职业"部分）
-                            info_lines.append(f"  主职业: {career.name} ({cc.current_stage}/{career.max_stage}阶 - {stage_name})")
+                # 主职业（只显示引用，详细信息在下面的"本章职业"部分）
+                info_lines.extend(_career_ref_lines(career_relations['main'], careers_map, stage_names, "  主职业: "))
                 
-                # 副职业
+                # 副职业也只显示引用
                 if career_relations['sub']:
                     info_lines.append(f"  副职业:")
-                    for cc in career_relations['sub']:
-                        career = careers_map.get(cc.career_id)
-                        if career:
-                            # 解析副职业阶段信息
-                            try:
-                                stages = json.loads(career.stages) if isinstance(career.stages, str) else career.stages
-                                current_stage_info = None
-                                for stage in stages:
-                                    if stage.get('level') == cc.current_stage:
-                                        current_stage_info = stage
-                                        break
-                                stage_name = current_stage_info.get('name', f'第{cc.current_stage}阶') if current_stage_info else f'第{cc.current_stage}阶'
-                            except (json.JSONDecodeError, AttributeError, TypeError):
-                                stage_name = f'第{cc.current_stage}阶'
-                            
-                            # 副职业也只显示引用
-                            info_lines.append(f"    - {career.name} ({cc.current_stage}/{career.max_stage}阶 - {stage_name})")
+                    info_lines.extend(_career_ref_lines(career_relations['sub'], careers_map, stage_names, "    - "))
             
             # === 角色关系信息 ===
-            if not c.is_organization:
-                from sqlalchemy import or_
-                rels_result = await db.execute(
-                    select(CharacterRelationship).where(
-                        CharacterRelationship.project_id == project_id,
-                        or_(
-                            CharacterRelationship.character_from_id == c.id,
-                            CharacterRelationship.character_to_id == c.id
-                        )
-                    )
-                )
-                rels = rels_result.scalars().all()
-                if rels:
-                    related_ids = set()
-                    for r in rels:
-                        related_ids.add(r.character_from_id)
-                        related_ids.add(r.character_to_id)
-                    related_ids.discard(c.id)
-                    if related_ids:
-                        names_result = await db.execute(
-                            select(Character.id, Character.name).where(Character.id.in_(related_ids))
-                        )
-                        name_map = {row.id: row.name for row in names_result}
-                        rel_parts = []
-                        for r in rels:
-                            if r.character_from_id == c.id:
-                                target_name = name_map.get(r.character_to_id, "未知")
-                            else:
-                                target_name = name_map.get(r.character_from_id, "未知")
-                            rel_name = r.relationship_name or "相关"
-                            rel_parts.append(f"与{target_name}：{rel_name}")
-                        info_lines.append(f"  关系网络: {'；'.join(rel_parts)}")
+            rels = rels_by_char.get(char_id)
+            if rels:
+                rel_parts = [
+                    f"与{(r.to_name if r.character_from_id == char_id else r.from_name) or '未知'}"
+                    f"：{r.relationship_name or '相关'}"
+                    for r in rels
+                ]
+                info_lines.append(f"  关系网络: {'；'.join(rel_parts)}")
             
             # === 组织特有信息 ===
             if c.is_organization:
                 if c.organization_type:
                     info_lines.append(f"  组织类型: {c.organization_type}")
                 if c.organization_purpose:
-                    info_lines.append(f"  组织目的: {c.organization_purpose[:100]}")
-                # 从 OrganizationMember 表动态查询组织成员
-                org_result = await db.execute(
-                    select(Organization).where(Organization.character_id == c.id)
-                )
-                org = org_result.scalar_one_or_none()
-                if org:
-                    members_result = await db.execute(
-                        select(OrganizationMember, Character.name).join(
-                            Character, OrganizationMember.character_id == Character.id
-                        ).where(OrganizationMember.organization_id == org.id)
-                    )
-                    members = members_result.all()
-                    if members:
-                        member_parts = [f"{name}（{m.position}）" for m, name in members]
-                        info_lines.append(f"  组织成员: {'、'.join(member_parts)[:100]}")
+                    info_lines.append(f"  组织目的: {c.organization_purpose}")
+                # 组织成员（已在循环前批量查询）
+                members = members_by_org_char.get(char_id)
+                if members:
+                    member_parts = [f"{name}（{m.position}）" for m, name in members]
+                    info_lines.append(f"  组织成员: {'、'.join(member_parts)[:100]}")
             
             # 组合完整信息
             full_info = "\n".join(info_lines)
@@ -1471,18 +1668,12 @@ class OneToOneContextBuilder:
                     career_lines.append(f"  分类: {career.category}")
                 
                 # 阶段体系
-                try:
-                    stages = json.loads(career.stages) if isinstance(career.stages, str) else career.stages
-                    if stages:
-                        career_lines.append(f"  阶段体系: (共{career.max_stage}阶)")
-                        for stage in stages:  # 显示所有阶段
-                            level = stage.get('level', '?')
-                            name = stage.get('name', '未命名')
-                            desc = stage.get('description', '')
-                            career_lines.append(f"    {level}阶-{name}: {desc}")
-                except (json.JSONDecodeError, AttributeError, TypeError) as e:
-                    logger.warning(f"解析职业阶段失败: {e}")
+                stages = stages_by_career[career_id]
+                if stages is None:
                     career_lines.append(f"  阶段体系: 共{career.max_stage}阶")
+                elif stages:
+                    career_lines.append(f"  阶段体系: (共{career.max_stage}阶)")
+                    career_lines.extend(_career_stage_lines(stages))  # 显示所有阶段
                 
                 # 职业要求
                 if career.requirements:
@@ -1498,13 +1689,9 @@ class OneToOneContextBuilder:
                 
                 # 属性加成
                 if career.attribute_bonuses:
-                    try:
-                        bonuses = json.loads(career.attribute_bonuses) if isinstance(career.attribute_bonuses, str) else career.attribute_bonuses
-                        if bonuses:
-                            bonus_str = ", ".join([f"{k}:{v}" for k, v in bonuses.items()])
-                            career_lines.append(f"  属性加成: {bonus_str}")
-                    except (json.JSONDecodeError, AttributeError, TypeError):
-                        pass
+                    bonus_str = _format_attribute_bonuses(career.attribute_bonuses)
+                    if bonus_str:
+                        career_lines.append(f"  属性加成: {bonus_str}")
                 
                 careers_info_parts.append("\n".join(career_lines))
         
@@ -1523,74 +1710,7 @@ class OneToOneContextBuilder:
         chapter_number: int,
         db: AsyncSession
     ) -> Optional[str]:
-        """
-        获取伏笔提醒信息（增强版）
-        
-        策略：
-        1. 本章必须回收的伏笔（target_resolve_chapter_number == chapter_number）
-        2. 超期未回收的伏笔（target_resolve_chapter_number < chapter_number）
-        3. 即将到期的伏笔（target_resolve_chapter_number 在未来3章内）
-        """
+        """获取伏笔提醒信息（本章必须回收、超期、即将到期）"""
         if not self.foreshadow_service:
             return None
-        
-        try:
-            lines = []
-            
-            # 1. 本章必须回收的伏笔
-            must_resolve = await self.foreshadow_service.get_must_resolve_foreshadows(
-                db=db,
-                project_id=project_id,
-                chapter_number=chapter_number
-            )
-            
-            if must_resolve:
-                lines.append("【🎯 本章必须回收的伏笔】")
-                for f in must_resolve:
-                    lines.append(f"- {f.title}")
-                    lines.append(f"  埋入章节：第{f.plant_chapter_number}章")
-                    lines.append(f"  伏笔内容：{f.content[:100]}{'...' if len(f.content) > 100 else ''}")
-                    if f.resolution_notes:
-                        lines.append(f"  回收提示：{f.resolution_notes}")
-                    lines.append("")
-            
-            # 2. 超期未回收的伏笔
-            overdue = await self.foreshadow_service.get_overdue_foreshadows(
-                db=db,
-                project_id=project_id,
-                current_chapter=chapter_number
-            )
-            
-            if overdue:
-                lines.append("【⚠️ 超期待回收伏笔】")
-                for f in overdue[:3]:  # 最多显示3个
-                    overdue_chapters = chapter_number - (f.target_resolve_chapter_number or 0)
-                    lines.append(f"- {f.title} [已超期{overdue_chapters}章]")
-                    lines.append(f"  埋入章节：第{f.plant_chapter_number}章，原计划第{f.target_resolve_chapter_number}章回收")
-                    lines.append(f"  伏笔内容：{f.content[:80]}...")
-                    lines.append("")
-            
-            # 3. 即将到期的伏笔（未来3章内）
-            upcoming = await self.foreshadow_service.get_pending_resolve_foreshadows(
-                db=db,
-                project_id=project_id,
-                current_chapter=chapter_number,
-                lookahead=3
-            )
-            
-            # 过滤：只保留未来章节的，排除本章和超期的
-            upcoming_filtered = [f for f in upcoming
-                               if (f.target_resolve_chapter_number or 0) > chapter_number]
-            
-            if upcoming_filtered:
-                lines.append("【📋 即将到期的伏笔（仅供参考）】")
-                for f in upcoming_filtered[:3]:  # 最多显示3个
-                    remaining = (f.target_resolve_chapter_number or 0) - chapter_number
-                    lines.append(f"- {f.title}（计划第{f.target_resolve_chapter_number}章回收，还有{remaining}章）")
-                lines.append("")
-            
-            return "\n".join(lines) if lines else None
-            
-        except Exception as e:
-            logger.error(f"❌ 获取伏笔提醒失败: {str(e)}")
-            return None
+        return await _build_foreshadow_reminders(self.foreshadow_service, project_id, chapter_number, db)
@@ -1,7 +1,9 @@
 """伏笔管理服务 - 处理伏笔的CRUD和业务逻辑"""
 from typing import List, Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, desc, func, delete, update
+from sqlalchemy import select, and_, or_, case, desc, func, delete, update, event, inspect as sa_inspect
+from sqlalchemy.orm import Session
+from collections import defaultdict
 from datetime import datetime
 import uuid
 import hashlib
@@ -18,6 +20,45 @@ from app.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 伏笔修改代数（进程内）: 项目ID -> 代数，键None表示无法确定项目的批量UPDATE/DELETE
+# 事务提交时递增，作为伏笔版本的一部分；updated_at在SQLite上只有秒级精度，
+# 同一秒内的修改仅靠(数量, 最近更新时间)无法区分
+_FORESHADOW_GENERATIONS: Dict[Optional[str], int] = defaultdict(int)
+_PENDING_FORESHADOW_CHANGES = "pending_foreshadow_changes"
+
+
+def _mark_foreshadow_changed(session: Session, project_id: Optional[str]) -> None:
+    """记录当前事务修改了某项目的伏笔，提交后再递增代数"""
+    session.info.setdefault(_PENDING_FORESHADOW_CHANGES, set()).add(project_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_foreshadow_flush(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Foreshadow):
+            # 只读取已加载的属性，避免在flush事件中触发加载
+            _mark_foreshadow_changed(session, sa_inspect(obj).dict.get('project_id'))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_foreshadow_bulk_statement(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Foreshadow:
+        _mark_foreshadow_changed(orm_execute_state.session, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_foreshadow_generations(session):
+    for project_id in session.info.pop(_PENDING_FORESHADOW_CHANGES, ()):
+        _FORESHADOW_GENERATIONS[project_id] += 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_foreshadow_changes(session):
+    session.info.pop(_PENDING_FORESHADOW_CHANGES, None)
+
 
 def generate_stable_foreshadow_id(chapter_id: str, content: str, foreshadow_type: str = "planted") -> str:
     """
@@ -553,6 +594,99 @@ class ForeshadowService:
             logger.error(f"❌ 获取本章必须回收伏笔失败: {str(e)}")
             return []
     
+    async def get_foreshadow_version(
+        self,
+        db: AsyncSession,
+        project_id: str
+    ) -> tuple:
+        """
+        获取项目伏笔的版本标识（伏笔数量, 最近更新时间, 项目修改代数, 批量修改代数）
+        
+        伏笔的新增、删除与修改都会改变该值，可用于判断基于伏笔生成的缓存是否失效；
+        修改代数保证同一秒内的多次修改也能区分
+        """
+        result = await db.execute(
+            select(func.count(Foreshadow.id), func.max(Foreshadow.updated_at))
+            .where(Foreshadow.project_id == project_id)
+        )
+        count, last_updated = result.one()
+        return (
+            count,
+            last_updated,
+            _FORESHADOW_GENERATIONS.get(project_id, 0),
+            _FORESHADOW_GENERATIONS.get(None, 0)
+        )
+    
+    async def get_reminder_foreshadows(
+        self,
+        db: AsyncSession,
+        project_id: str,
+        chapter_number: int,
+        lookahead: int = 3,
+        limit: Optional[int] = None
+    ) -> Dict[str, List[Foreshadow]]:
+        """
+        一次查询获取章节伏笔提醒所需的三类伏笔
+        
+        等价于 get_must_resolve_foreshadows、get_overdue_foreshadows 与
+        get_pending_resolve_foreshadows（仅未来章节）的合并，只需一次数据库往返
+        
+        Args:
+            db: 数据库会话
+            project_id: 项目ID
+            chapter_number: 当前章节号
+            lookahead: 即将到期伏笔向前看几章
+            limit: 超期与即将到期伏笔各自最多返回的数量（按目标回收章节升序），本章必须回收的不限制
+        
+        Returns:
+            {"must_resolve": 本章必须回收, "overdue": 超期未回收, "upcoming": 即将到期}
+        
+        查询异常直接抛出，由调用方决定降级方式（避免把查询失败当作没有伏笔）
+        """
+        target = Foreshadow.target_resolve_chapter_number
+        conditions = and_(
+            Foreshadow.project_id == project_id,
+            Foreshadow.status == "planted",
+            target != None,
+            target <= chapter_number + lookahead,
+            # 即将到期的伏笔只提醒开启了自动提醒的
+            or_(target <= chapter_number, Foreshadow.auto_remind == True)
+        )
+        ordering = (target, desc(Foreshadow.importance))
+        
+        if limit is None:
+            query = select(Foreshadow).where(conditions).order_by(*ordering)
+        else:
+            # 按类别编号后在SQL中截取，超出数量的伏笔不再传输和构造ORM对象
+            bucket = case((target == chapter_number, 0), (target < chapter_number, 1), else_=2)
+            ranked = (
+                select(
+                    Foreshadow.id.label('id'),
+                    bucket.label('bucket'),
+                    func.row_number().over(partition_by=bucket, order_by=ordering).label('rn')
+                )
+                .where(conditions)
+                .subquery()
+            )
+            query = (
+                select(Foreshadow)
+                .join(ranked, ranked.c.id == Foreshadow.id)
+                .where(or_(ranked.c.bucket == 0, ranked.c.rn <= limit))
+                .order_by(*ordering)
+            )
+        
+        result = await db.execute(query)
+        buckets: Dict[str, List[Foreshadow]] = {"must_resolve": [], "overdue": [], "upcoming": []}
+        for f in result.scalars().all():
+            target = f.target_resolve_chapter_number
+            if target == chapter_number:
+                buckets["must_resolve"].append(f)
+            elif target < chapter_number:
+                buckets["overdue"].append(f)
+            else:
+                buckets["upcoming"].append(f)
+        return buckets
+    
     async def get_foreshadows_to_plant(
         self,
         db: AsyncSession,
@@ -8,13 +8,37 @@ import httpx
 from app.logger import get_logger
 import os
 import hashlib
-from sqlalchemy import select
+import asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings as app_settings
-from app.models.settings import Settings
+from app.services.settings_cache import settings_cache
+from app.utils.ttl_cache import TTLCache, MISSING
 
 logger = get_logger(__name__)
 
+# 本地模型单次前向计算的批大小
+LOCAL_EMBEDDING_BATCH_SIZE = 64
+
+# 检索查询向量缓存: (embedding模式, provider, 模型, API地址, 查询文本摘要) -> 向量（10分钟过期，最多256条）
+# 同一章节重新生成时查询文本相同，避免重复调用embedding模型
+_QUERY_EMBEDDING_CACHE = TTLCache(ttl_seconds=600, max_entries=256)
+
+# 自适应相似度阈值：最相关结果置信度很高时收紧阈值过滤噪声；
+# 连最相关结果都达不到基准阈值时，按其相似度相对放宽（不低于下限），避免召回为空
+_ADAPTIVE_HIGH_CONFIDENCE_SIMILARITY = 0.8
+_ADAPTIVE_STRICT_SIMILARITY = 0.7
+_ADAPTIVE_RELATIVE_RATIO = 0.85
+_ADAPTIVE_SIMILARITY_FLOOR = 0.4
+
+
+def _adaptive_similarity_threshold(top_similarity: float, base_threshold: float) -> float:
+    """根据最相关结果的相似度调整基准阈值"""
+    if top_similarity > _ADAPTIVE_HIGH_CONFIDENCE_SIMILARITY:
+        return max(base_threshold, _ADAPTIVE_STRICT_SIMILARITY)
+    if top_similarity > base_threshold:
+        return base_threshold
+    return max(top_similarity * _ADAPTIVE_RELATIVE_RATIO, _ADAPTIVE_SIMILARITY_FLOOR)
+
 # 配置模型缓存目录
 # 优先使用 backend/embedding 目录（打包后的实际位置）
 import sys
@@ -297,8 +321,7 @@ class MemoryService:
 
         if db is not None:
             try:
-                result = await db.execute(select(Settings).where(Settings.user_id == user_id))
-                user_settings = result.scalar_one_or_none()
+                user_settings = await settings_cache.get_settings(user_id, db)
                 if user_settings:
                     config.update({
                         "embedding_mode": user_settings.embedding_mode or config["embedding_mode"],
@@ -344,6 +367,14 @@ class MemoryService:
 
         return config
 
+    async def resolve_embedding_config(
+        self,
+        user_id: str,
+        db: Optional[AsyncSession] = None
+    ) -> Dict[str, str]:
+        """解析用户 Embedding 配置，供批量/并发写入前一次性解析后作为 embedding_config 传入。"""
+        return await self._resolve_embedding_config(user_id=user_id, db=db)
+
     def _build_collection_name(self, user_id: str, project_id: str, embedding_config: Dict[str, Any]) -> str:
         """根据 embedding 配置生成 collection 名称。
 
@@ -410,6 +441,16 @@ class MemoryService:
             )
         return embeddings
 
+    async def embed_texts(
+        self,
+        texts: List[str],
+        embedding_config: Dict[str, Any]
+    ) -> List[List[float]]:
+        """按已解析的 embedding 配置生成向量（可提前计算后传给 batch_add_memories）。"""
+        if not texts:
+            return []
+        return await self._embed_texts(texts, embedding_config)
+
     async def _embed_texts(
         self,
         texts: List[str],
@@ -420,11 +461,39 @@ class MemoryService:
             return await self._embed_texts_with_api(texts, embedding_config)
 
         self._ensure_local_embedding_model()
-        vectors = self.embedding_model.encode(texts).tolist()
+        # 整批一次前向计算；放到线程中执行，避免CPU密集的编码阻塞事件循环
+        vectors = (await asyncio.to_thread(
+            self.embedding_model.encode,
+            texts,
+            batch_size=LOCAL_EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )).tolist()
         if vectors and isinstance(vectors[0], (int, float)):
             return [vectors]
         return vectors
 
+    async def _embed_query(
+        self,
+        query: str,
+        embedding_config: Dict[str, Any]
+    ) -> List[float]:
+        """生成检索查询向量（短期缓存，相同查询文本与embedding配置复用向量）"""
+        cache_key = (
+            embedding_config.get("embedding_mode"),
+            embedding_config.get("embedding_provider"),
+            embedding_config.get("embedding_model"),
+            embedding_config.get("embedding_api_base_url"),
+            hashlib.blake2b(query.encode("utf-8"), digest_size=16).digest(),
+        )
+        cached = _QUERY_EMBEDDING_CACHE.get(cache_key)
+        if cached is not MISSING:
+            return cached
+        
+        query_embedding = (await self._embed_texts([query], embedding_config))[0]
+        _QUERY_EMBEDDING_CACHE.set(cache_key, query_embedding)
+        return query_embedding
+
     def get_collection(
         self,
         user_id: str,
@@ -534,7 +603,8 @@ class MemoryService:
         project_id: str,
         memories: List[Dict[str, Any]],
         db: Optional[AsyncSession] = None,
-        embedding_config: Optional[Dict[str, Any]] = None
+        embedding_config: Optional[Dict[str, Any]] = None,
+        embeddings: Optional[List[List[float]]] = None
     ) -> int:
         """
         批量添加记忆(性能更好)
@@ -543,6 +613,7 @@ class MemoryService:
             user_id: 用户ID
             project_id: 项目ID
             memories: 记忆列表,每个包含id、content、type、metadata
+            embeddings: 预先计算好的向量(可选,需与memories一一对应,须使用相同embedding配置生成)
         
         Returns:
             成功添加的数量
@@ -582,18 +653,30 @@ class MemoryService:
                     "embedding_model": str(resolved_config.get("embedding_model", ""))[:200],
                     "created_at": datetime.now().isoformat()
                 }
+                
+                # 添加相关角色信息
+                if metadata.get("related_characters"):
+                    chroma_metadata["related_characters"] = json.dumps(
+                        metadata["related_characters"],
+                        ensure_ascii=False
+                    )
                 metadatas.append(chroma_metadata)
 
-            # 批量生成embedding
-            embeddings = await self._embed_texts(documents_for_embedding, resolved_config)
+            # 批量生成embedding（已有预计算向量时跳过）
+            if embeddings is None or len(embeddings) != len(documents_for_embedding):
+                embeddings = await self._embed_texts(documents_for_embedding, resolved_config)
             
-            # 批量添加
-            collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=documents,
-                metadatas=metadatas
-            )
+            # 按ChromaDB单次写入上限分批添加；写入在线程中执行，避免大批量落盘阻塞事件循环
+            max_batch_size = self.client.get_max_batch_size()
+            for start in range(0, len(ids), max_batch_size):
+                end = start + max_batch_size
+                await asyncio.to_thread(
+                    collection.add,
+                    ids=ids[start:end],
+                    embeddings=embeddings[start:end],
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end]
+                )
             
             logger.info(f"✅ 批量添加记忆成功: {len(memories)}条")
             return len(memories)
@@ -612,7 +695,9 @@ class MemoryService:
         min_importance: float = 0.0,
         chapter_range: Optional[tuple] = None,
         db: Optional[AsyncSession] = None,
-        embedding_config: Optional[Dict[str, Any]] = None
+        embedding_config: Optional[Dict[str, Any]] = None,
+        min_similarity: Optional[float] = None,
+        adaptive_similarity: bool = False
     ) -> List[Dict[str, Any]]:
         """
         语义搜索相关记忆
@@ -625,6 +710,8 @@ class MemoryService:
             limit: 返回结果数量
             min_importance: 最低重要性阈值
             chapter_range: 章节范围 (start, end)
+            min_similarity: 相似度阈值，只返回相似度大于该值的记忆
+            adaptive_similarity: 是否根据最相关结果的相似度自适应调整min_similarity
         
         Returns:
             相关记忆列表,按相似度排序
@@ -637,8 +724,8 @@ class MemoryService:
             )
             collection = self.get_collection(user_id, project_id, resolved_config)
             
-            # 生成查询向量
-            query_embedding = (await self._embed_texts([query], resolved_config))[0]
+            # 生成查询向量（命中缓存时不再调用embedding模型）
+            query_embedding = await self._embed_query(query, resolved_config)
             
             # 构建过滤条件 - ChromaDB要求使用$and组合多个条件
             where_filter = None
@@ -667,15 +754,23 @@ class MemoryService:
                 where=where_filter
             )
             
-            # 格式化结果
+            # 格式化结果（ChromaDB按距离升序返回，低于相似度阈值后即可停止）
             memories = []
+            threshold = min_similarity
             if results['ids'] and results['ids'][0]:
                 for i in range(len(results['ids'][0])):
+                    similarity = 1 - results['distances'][0][i] if 'distances' in results else 1.0
+                    if i == 0 and threshold is not None and adaptive_similarity:
+                        threshold = _adaptive_similarity_threshold(similarity, threshold)
+                        if threshold != min_similarity:
+                            logger.info(f"🎯 自适应相似度阈值: {min_similarity} -> {threshold:.2f} (最高相似度{similarity:.2f})")
+                    if threshold is not None and similarity <= threshold:
+                        break
                     memories.append({
                         "id": results['ids'][0][i],
                         "content": results['documents'][0][i],
                         "metadata": results['metadatas'][0][i],
-                        "similarity": 1 - results['distances'][0][i] if 'distances' in results else 1.0,
+                        "similarity": similarity,
                         "distance": results['distances'][0][i] if 'distances' in results else 0.0
                     })
             
@@ -2,6 +2,12 @@
 from typing import Dict, Any, Optional
 import json
 
+from app.utils.ttl_cache import TTLCache, MISSING
+
+# 用户模板缓存: (user_id, template_key) -> 模板内容（60秒过期，最多1024条）
+# 模板写入接口需调用 PromptService.invalidate_template_cache
+_TEMPLATE_CACHE = TTLCache(ttl_seconds=60, max_entries=1024)
+
 
 class WritingStyleManager:
     """写作风格管理器"""
@@ -2646,6 +2652,12 @@ class PromptService:
         
         logger = get_logger(__name__)
         
+        # 0. 命中缓存直接返回
+        cache_key = (user_id, template_key)
+        cached = _TEMPLATE_CACHE.get(cache_key)
+        if cached is not MISSING:
+            return cached
+        
         # 1. 尝试从数据库获取用户自定义模板
         result = await db.execute(
             select(PromptTemplate).where(
@@ -2658,19 +2670,37 @@ class PromptService:
         
         if custom_template:
             logger.info(f"✅ 使用用户自定义提示词: user_id={user_id}, template_key={template_key}, template_name={custom_template.template_name}")
-            return custom_template.template_content
-        
-        # 2. 降级到系统默认模板
-        logger.info(f"⚪ 使用系统默认提示词: user_id={user_id}, template_key={template_key} (未找到自定义模板)")
-        
-        # 直接从类属性获取系统默认模板
-        template_content = getattr(cls, template_key, None)
+            template_content = custom_template.template_content
+        else:
+            # 2. 降级到系统默认模板
+            logger.info(f"⚪ 使用系统默认提示词: user_id={user_id}, template_key={template_key} (未找到自定义模板)")
+            
+            # 直接从类属性获取系统默认模板
+            template_content = getattr(cls, template_key, None)
+            
+            if template_content is None:
+                logger.warning(f"⚠️ 未找到系统默认模板: {template_key}")
         
-        if template_content is None:
-            logger.warning(f"⚠️ 未找到系统默认模板: {template_key}")
+        _TEMPLATE_CACHE.set(cache_key, template_content)
         
         return template_content
     
+    @staticmethod
+    def invalidate_template_cache(user_id: Optional[str] = None, template_key: Optional[str] = None):
+        """
+        使模板缓存失效
+        
+        Args:
+            user_id: 用户ID，为None时清空所有缓存
+            template_key: 模板键名，为None时清空该用户的全部模板缓存
+        """
+        if user_id is None:
+            _TEMPLATE_CACHE.clear()
+        elif template_key is not None:
+            _TEMPLATE_CACHE.discard((user_id, template_key))
+        else:
+            _TEMPLATE_CACHE.discard_where(lambda key: key[0] == user_id)
+    
     @classmethod
     def get_all_system_templates(cls) -> list:
         """
@@ -0,0 +1,157 @@
+"""用户设置缓存 - 减少高频接口对 Settings 表的重复查询
+
+缓存内容为与会话无关的纯数据快照，避免ORM对象跨会话泄漏。
+设置写入接口需调用 invalidate_cache 使缓存失效。
+"""
+from typing import Optional, Dict, Any
+from datetime import datetime, timedelta
+from dataclasses import dataclass, fields
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.logger import get_logger
+from app.models.settings import Settings
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """用户设置快照（只读）"""
+    user_id: str
+    api_provider: Optional[str]
+    api_key: Optional[str]
+    api_base_url: Optional[str]
+    llm_model: Optional[str]
+    embedding_mode: Optional[str]
+    embedding_provider: Optional[str]
+    embedding_model: Optional[str]
+    embedding_api_key: Optional[str]
+    embedding_api_base_url: Optional[str]
+    temperature: Optional[float]
+    max_tokens: Optional[int]
+    system_prompt: Optional[str]
+
+    @classmethod
+    def from_model(cls, settings: Settings) -> "SettingsSnapshot":
+        return cls(**{f.name: getattr(settings, f.name) for f in fields(cls)})
+
+
+@dataclass
+class UserSettingsCache:
+    """用户设置缓存条目"""
+    snapshot: SettingsSnapshot
+    expire_time: datetime
+    hit_count: int = 0
+
+
+class SettingsCache:
+    """
+    用户设置缓存
+
+    按 user_id 缓存 Settings 快照，TTL 过期或设置被修改时失效。
+    未配置设置的用户不缓存，保证首次保存后立即可见。
+    """
+
+    _instance: Optional['SettingsCache'] = None
+
+    def __new__(cls):
+        """单例模式"""
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+
+        # 用户设置缓存: user_id -> UserSettingsCache
+        self._cache: Dict[str, UserSettingsCache] = {}
+
+        # 缓存TTL（60秒）
+        self._cache_ttl = timedelta(seconds=60)
+
+        # 最大缓存用户数
+        self._max_entries = 1024
+
+        self._initialized = True
+
+    async def get_settings(
+        self,
+        user_id: str,
+        db: AsyncSession
+    ) -> Optional[SettingsSnapshot]:
+        """
+        获取用户设置快照
+
+        Args:
+            user_id: 用户ID
+            db: 数据库会话（缓存未命中时使用）
+
+        Returns:
+            设置快照，用户未配置设置时返回None
+        """
+        now = datetime.now()
+
+        cache_entry = self._cache.get(user_id)
+        if cache_entry is not None:
+            if now < cache_entry.expire_time:
+                cache_entry.hit_count += 1
+                return cache_entry.snapshot
+            del self._cache[user_id]
+
+        result = await db.execute(
+            select(Settings).where(Settings.user_id == user_id)
+        )
+        settings = result.scalar_one_or_none()
+        if not settings:
+            return None
+
+        snapshot = SettingsSnapshot.from_model(settings)
+
+        if len(self._cache) >= self._max_entries:
+            self._evict_expired(now)
+            if len(self._cache) >= self._max_entries:
+                # 仍然已满时淘汰最早写入的条目
+                self._cache.pop(next(iter(self._cache)))
+
+        self._cache[user_id] = UserSettingsCache(
+            snapshot=snapshot,
+            expire_time=now + self._cache_ttl
+        )
+        return snapshot
+
+    def _evict_expired(self, now: datetime) -> None:
+        """清理所有已过期条目"""
+        expired = [uid for uid, e in self._cache.items() if now >= e.expire_time]
+        for uid in expired:
+            del self._cache[uid]
+
+    def invalidate_cache(self, user_id: Optional[str] = None):
+        """
+        使缓存失效
+
+        Args:
+            user_id: 用户ID，为None时清空所有缓存
+        """
+        if user_id:
+            if self._cache.pop(user_id, None) is not None:
+                logger.debug(f"🧹 清理用户设置缓存: {user_id}")
+        else:
+            count = len(self._cache)
+            self._cache.clear()
+            logger.info(f"🧹 清理所有用户设置缓存 ({count}个)")
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        return {
+            "total_entries": len(self._cache),
+            "total_hits": sum(e.hit_count for e in self._cache.values()),
+            "cache_ttl_seconds": self._cache_ttl.total_seconds(),
+        }
+
+
+# 全局单例
+settings_cache = SettingsCache()
@@ -0,0 +1,63 @@
+"""进程内TTL缓存 - 带过期时间与容量上限的简单键值缓存"""
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# get() 未命中时的默认返回值（缓存值本身可以是None）
+MISSING = object()
+
+
+class TTLCache:
+    """
+    进程内TTL缓存
+
+    条目写入后ttl_seconds秒过期；容量满时先清理过期条目，
+    仍然已满则淘汰最早写入的条目。仅在单个事件循环内使用，不做加锁。
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self._ttl_seconds = ttl_seconds
+        self._max_entries = max_entries
+        # key -> (过期时间, 值)
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """获取未过期的缓存值，未命中或已过期时返回default"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if time.monotonic() < entry[0]:
+            return entry[1]
+        del self._entries[key]
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """写入缓存值"""
+        now = time.monotonic()
+        self._entries.pop(key, None)
+        if len(self._entries) >= self._max_entries:
+            self._evict_expired(now)
+            if len(self._entries) >= self._max_entries:
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (now + self._ttl_seconds, value)
+
+    def discard(self, key: Hashable) -> None:
+        """删除指定条目（不存在时忽略）"""
+        self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """删除键满足条件的所有条目"""
+        for key in [k for k in self._entries if predicate(k)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict_expired(self, now: float) -> None:
+        """清理所有已过期条目"""
+        expired = [k for k, (expire_at, _) in self._entries.items() if now >= expire_at]
+        for key in expired:
+            del self._entries[key]
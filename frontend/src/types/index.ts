@@ -990,8 +990,14 @@ export interface BookSplitResponse {
   chapters: BookAnalysisChapterPreview[];
 }
 
+export interface BookPreSplitChapter {
+  title: string;
+  content: string;
+}
+
 export interface BookAnalyzeRequest {
   content: string;
+  pre_split_chapters?: BookPreSplitChapter[];
   project_id?: string;
   enable_embedding?: boolean;
   embedding_chunk_size?: number;